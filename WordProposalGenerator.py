@@ -1,10 +1,102 @@
 from pdf_gen_helper_functions import *
 from os.path import join
-from psycopg2 import connect
-from psycopg2 import sql
-from docx import Document
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from collections import ChainMap
+from docxcompose.composer import Composer
+from docx import Document as Composer_Document
+from section_cache import section_cache_key, section_cache_get, section_cache_put
+from proposal_data import ProposalData, QueryResult
+from tag_schema import GENERAL_SITE_INFO_TAGS, SITE_SURVEY_TAGS, ENVIRONMENTAL_PROTECTION_TAGS, COVERSHEET_TAGS
 import glob
+import os
+
+# Every section renderer that can be run by `WordProposalGenerator.render_sections` mapped to a 2-tuple. The first
+# element is the label printed when the renderer starts and the second is the list of ProposalData queries the renderer
+# reads. These queries are run up front so that the renderers only read memoized rows while they run concurrently.
+SECTION_RENDERERS = {
+    "generate_coversheet_page_full": ("COVER PAGE", ["proposal", "coversheet", "coversheet_proponent_map", "proponent", "lead_proponent"]),
+    "generate_coversheet_page_pre_leap": ("COVER PAGE", ["proposal", "coversheet", "coversheet_proponent_map", "proponent", "lead_proponent"]),
+    "generate_coversheet_page_full_leap": ("COVER PAGE", ["proposal", "coversheet", "coversheet_proponent_map", "proponent", "lead_proponent"]),
+    "generate_proposed_sites_page": ("PROPOSED SITES PAGE", ["proposal", "site", "site_operational_info"]),
+    "generate_proponents_page": ("PROPONENTS PAGE", ["proposal", "coversheet_proponent_map", "proponent", "sso_users"]),
+    "generate_safety_review_prep_page": ("SAFETY REVIEW PREP PAGE", ["srr_checklist"]),
+    "generate_site_forms_full": ("SITE FORMS", ["proposal", "coversheet", "site", "site_operational_info", "site_measurements", "site_dataset_info", "site_pollution_safety", "site_lithos"]),
+    "generate_site_forms_pre": ("SITE FORMS", ["proposal", "coversheet", "site", "site_operational_info", "site_measurements"]),
+}
+
+# The Word templates filled in by each coversheet renderer in the order they appear in the PDF.
+COVERSHEET_TEMPLATES = {
+    "generate_coversheet_page_full": ["iodp_proposal_pdf_coversheet_template0.docx",
+                                      "iodp_proposal_pdf_coversheet_template1.docx",
+                                      "iodp_proposal_pdf_coversheet_template2.docx",
+                                      "iodp_proposal_pdf_coversheet_template3.docx",
+                                      "iodp_proposal_pdf_coversheet_template4.docx"],
+    "generate_coversheet_page_pre_leap": ["iodp_proposal_pdf_coversheet_template0.docx",
+                                          "iodp_proposal_pdf_coversheet_template1.docx",
+                                          "iodp_proposal_pdf_coversheet_template2_leap.docx"],
+    "generate_coversheet_page_full_leap": ["iodp_proposal_pdf_coversheet_template0.docx",
+                                           "iodp_proposal_pdf_coversheet_template1.docx",
+                                           "iodp_proposal_pdf_coversheet_template2_leap.docx",
+                                           "iodp_proposal_pdf_coversheet_template4_leap.docx"],
+}
+
+# The Word templates filled in for every site by generate_site_forms_full and generate_site_forms_pre respectively.
+SITE_FORM_TEMPLATES_FULL = ["iodp_proposal_pdf_site_info_template0.docx",
+                            "iodp_proposal_pdf_site_info_template1.docx",
+                            "iodp_proposal_pdf_site_info_template2.docx",
+                            "iodp_proposal_pdf_site_survey_template.docx",
+                            "iodp_proposal_pdf_site_env_protection_template.docx",
+                            "iodp_proposal_pdf_site_lithologies_template.docx"]
+SITE_FORM_TEMPLATES_PRE = SITE_FORM_TEMPLATES_FULL[:3]
+
+# The coversheet tags used in the header and footer of the first coversheet template. docxcompose keeps only the header
+# and footer of the document that everything is appended to so these appear on every page of the PDF. The footer's
+# `generated_date` is left blank. The generation time is stamped onto the merged PDF instead (see `footer_text`).
+FRAME_TAGS = ["proposal_number", "proposal_type_name", "proposal_version", "generated_date"]
+
+# The ProposalData queries read by get_coversheet_tags, which every section reads for its frame (see FRAME_TAGS).
+FRAME_QUERIES = ["proposal", "coversheet", "coversheet_proponent_map", "proponent", "lead_proponent"]
+
+
+def memoize_tags(*queries):
+    """
+    Cache the tag dict returned by a method of WordProposalGenerator in its `tag_cache` so that it's only built once per
+    generator. The dict is built again if the result of one of the ProposalData `queries` it's built from has changed
+    since (see `ProposalData.invalidate`). The cached dict is shared by every caller so it must not be modified.
+    :param queries: These are the str names of the ProposalData queries the method reads.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self):
+            results = [getattr(self.data, query) for query in queries]
+            cached = self.tag_cache.get(method.__name__)
+            if cached is not None and all(a is b for a, b in zip(cached[0], results)):
+                return cached[1]
+            tags = method(self)
+            self.tag_cache[method.__name__] = (results, tags)
+            return tags
+        return wrapper
+    return decorator
+
+
+def select_template_tags(tags, template_paths, i=None):
+    """
+    Select the tags that occur in a set of Word templates (see docx_get_template_tags), e.g. to put only the tags that a
+    section is filled in with into its cache key. If `tags` is a LazyTags then only the selected tags are computed.
+    :param tags: This is a dict (or other Mapping) of tags.
+    :param template_paths: This is a list of str absolute paths to the Word templates.
+    :param i: This is an optional int index of a site. If it's specified then per-site tags (lists indexed by site) are
+    replaced with the site's element.
+    :return: A dict of the selected tags.
+    """
+    used = set().union(*(docx_get_template_tags(template_path) for template_path in template_paths))
+    selected = {tag: tags[tag] for tag in used if tag in tags}
+    if i is not None:
+        selected = {tag: get_safely(value, i) if isinstance(value, list) else value for tag, value in selected.items()}
+    return selected
+
 
 class WordProposalGenerator:
     """
@@ -16,533 +108,312 @@ class WordProposalGenerator:
     docx_search_and_replace_tags function in the Word static library. This class reads data from a .env file which
     must be in the same directory as this file.
     """
-    def __init__(self, pid):
+    def __init__(self, pid, conn=None, proposal_row=None, proposal_cols=None, prefetched_rows=None):
+        """
+        :param pid: This str is the id of the proposal to generate Word documents for.
+        :param conn: This is an optional open psycopg2 connection to read from. If it isn't specified then a connection
+        is borrowed from the connection pool and `close` must be called to give it back. No connection is needed (or
+        borrowed) if `prefetched_rows` is specified.
+        :param proposal_row: This is an optional row of the proposal table for this proposal that the caller has
+        already read. If it's specified (along with `proposal_cols`) then the proposal table isn't queried again.
+        :param proposal_cols: This is the list of columns corresponding to `proposal_row`.
+        :param prefetched_rows: This is an optional str result of BULK_QUERY for this proposal that has already been
+        fetched (e.g. for a whole batch of proposals at once). If it's specified then every query is read from it instead
+        of the database.
+        """
         self.PROPOSAL_ID = pid
         self.PDF_GEN_DIR = validate_path(config("PDF_GEN_DIR"))
         self.LIBRE_OFFICE_PYTHON_INSTALLATION_PATH = validate_path(config("LIBRE_OFFICE_PYTHON_INSTALLATION_PATH"), True)
         self.PROPOSALS_BASE_DIR = validate_path(config("PROPOSALS_BASE_DIR"))
         self.PROPOSAL_DIR = validate_path(join(self.PROPOSALS_BASE_DIR, self.PROPOSAL_ID))
         self.PDF_UPLOADS_DIR = validate_path(join(self.PROPOSAL_DIR, "pdf_uploads"))
-        self.conn = connect(  # This variable links the iodpdatadev database to this program
-            host=config("DB_HOST"),
-            database=config("DB_DATABASE"),
-            user=config("DB_USERNAME"),
-            password=config("DB_PASSWORD"),
-            port=config("DB_PORT")
-        )
-        self.cur = self.conn.cursor()
-        # This list keeps track of queries that have already been performed so that we don't needlessly access the
-        # database with redundant queries.
-        self.tables_queried = []
-
-        # This list keeps track of all Word templates for sites that have been generated. It is a list of strings and
-        # the strings are filenames.
-        self.site_file_names = []
-
-        # This text is will appear at the bottom of the document.
+        # This variable links the iodpdatadev database to this program
+        self.conn_context = None
+        if conn is None and prefetched_rows is None:
+            self.conn_context = db_connection()
+            conn = self.conn_context.__enter__()
+        self.conn = conn
+        self.cur = conn.cursor() if conn is not None else None
+
+        # Reuse the proposal row if the caller already read it (gen.py reads it to decide which controller to call).
+        proposal = None
+        if proposal_row is not None and proposal_cols is not None:
+            proposal = QueryResult.make(proposal_cols, [proposal_row])
+        # Every table is read through this object. A table is only queried the first time it's read.
+        self.data = ProposalData(pid, self.cur, self.PDF_UPLOADS_DIR, proposal, prefetched_rows)
+        # The tag dicts built so far (see memoize_tags).
+        self.tag_cache = {}
+
+        # This text will appear at the bottom of every generated page. It isn't filled into the Word templates (which
+        # would make every converted section differ from the last) but stamped onto the merged PDF by the controllers.
         self.footer_text = 'Generated: ' + datetime.now().isoformat(timespec='milliseconds')
 
 
-    def get_db_rows(self, table):
+    def close(self):
         """
-        Access the database and get specific rows from it based on a pre-defined query that's hardcoded into this function.
-        This query is specified by supplying an argument to the table param.
-        :param table: This is a str identifier that select what table and what query to run. It's matched againt a list
-        of values in a switch-like statement and the result is that a specific query is run.
-        :return: This function returns a 2-tuple where the first element is the result of the query and the second element
-        is a list of all columns (in order) that were in the table specified
+        Give the connection borrowed from the connection pool back. This does nothing if the connection was passed in
+        to __init__ (the caller owns it then).
+        :return: None
         """
-        # If this table has already been queried then exit silently because it's member variable will already exist
-        if table in self.tables_queried:
-            return
-
-        if table == "COVERSHEET":
-            self.cur.execute("SELECT * FROM coversheet WHERE proposal_id = %s", (self.PROPOSAL_ID,))
-            self.COVERSHEET_ROW = self.cur.fetchone()
-            self.COVERSHEET_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "PROPOSAL":
-            self.cur.execute("SELECT * FROM proposal WHERE id = %s", (self.PROPOSAL_ID,))
-            self.PROPOSAL_ROW = self.cur.fetchone()
-            self.PROPOSAL_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "MAIN_TEXT_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'DOC'", (self.PROPOSAL_ID,))
-            self.MAIN_TEXT_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "SAFETY_REVIEW_REPORT_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'SRR'", (self.PROPOSAL_ID,))
-            self.SAFETY_REVIEW_REPORT_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "CURRICULUM_VITAE_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'CV'", (self.PROPOSAL_ID,))
-            self.CURRICULUM_VITAE_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "REVIEWERS_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'PR'", (self.PROPOSAL_ID,))
-            self.REVIEWERS_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "SCIENCE_PARTY_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'LEAP_SP'", (self.PROPOSAL_ID,))
-            self.SCIENCE_PARTY_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "REFERENCES_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'REFERENCES'", (self.PROPOSAL_ID,))
-            self.REFERENCES_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "ENGAGEMENT_PLAN_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'ENGAGEMENT'", (self.PROPOSAL_ID,))
-            self.ENGAGEMENT_PLAN_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "MANAGEMENT_PLAN_FILENAME":
-            self.cur.execute("SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'MANAGEMENT'", (self.PROPOSAL_ID,))
-            self.MANAGEMENT_PLAN_FILENAME = get_safely(self.cur.fetchone(), 0)
-
-        elif table == "COVERSHEET_PROPONENT_MAP":
-            self.cur.execute("SELECT * FROM coversheet_proponent_map WHERE proposal_id = %s ORDER BY ordering", (self.PROPOSAL_ID,))
-            self.COVERSHEET_PROPONENT_MAP_ROWS = self.cur.fetchall()
-            self.COVERSHEET_PROPONENT_MAP_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "SITE":
-            self.cur.execute("SELECT * FROM site WHERE proposal_id=%s ORDER BY ordering", (self.PROPOSAL_ID,))
-            self.SITE_ROWS = self.cur.fetchall()
-            self.SITE_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "PROPONENT":
-            self.get_db_rows("COVERSHEET_PROPONENT_MAP")
-            # Retrieve data from the proponent table by getting a tuple indicating all proponents of this proposal
-            proponent_ids = tuple(proponent[self.COVERSHEET_PROPONENT_MAP_COLS.index('proponent_id')] for proponent in self.COVERSHEET_PROPONENT_MAP_ROWS)
-
-            # Get the list of proponents from the coversheet_proponent_map table. First check that there is at least one proponent
-            # to get to prevent crashing from a bad query. If there are no proponents then adjust the query so that it returns
-            # an empty query rather than a NoneType so that the function that actually creates the proponent list doesn't realize
-            # anything is wrong. Repeat this same process for the Principle Lead (i.e. check if they exist and if not then handle
-            # it).
-            if proponent_ids:
-                self.cur.execute(sql.SQL(
-                    """SELECT * FROM proponent JOIN coversheet_proponent_map ON
-                    proponent.id = coversheet_proponent_map.proponent_id WHERE proponent.id IN {} ORDER BY
-                    coversheet_proponent_map.ordering""").format(sql.Literal(proponent_ids)))
-                self.PROPONENT_ROWS = self.cur.fetchall()
-                self.PROPONENT_COLS = [desc[0] for desc in self.cur.description]
-            else:
-                self.cur.execute("SELECT * FROM proponent LIMIT 0")
-                self.PROPONENT_ROWS = self.cur.fetchall()
-                self.PROPONENT_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "LEAD_PROPONENT":
-            self.get_db_rows("COVERSHEET_PROPONENT_MAP")
-            # Narrow the list of proposals to locate just the principle lead and query this person's proponent data. Technically
-            # this could be done via a list access of the PROPONENT_ROWS[] above but repetitive code is easier to understand.
-            principle_lead_id = tuple(
-                proponent[self.COVERSHEET_PROPONENT_MAP_COLS.index('proponent_id')] for proponent in
-                self.COVERSHEET_PROPONENT_MAP_ROWS if
-                proponent[self.COVERSHEET_PROPONENT_MAP_COLS.index('role')] == 'Principal Lead' or proponent[
-                    self.COVERSHEET_PROPONENT_MAP_COLS.index('role')] == 'Principal Lead and Data Lead')
-
-            if principle_lead_id:
-                self.cur.execute(sql.SQL("SELECT * FROM proponent WHERE id IN {}").format(sql.Literal(principle_lead_id)))
-                self.LEAD_PROPONENT_ROW = self.cur.fetchone()
-                self.LEAD_PROPONENT_COLS = [desc[0] for desc in self.cur.description]
-            else:
-                self.cur.execute("SELECT * FROM proponent LIMIT 0")
-                self.LEAD_PROPONENT_ROW = self.cur.fetchone()
-                self.LEAD_PROPONENT_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "SITE_OPERATIONAL_INFO":
-            self.get_db_rows("SITE")
-            site_numbers = tuple(site[self.SITE_COLS.index('id')] for site in self.SITE_ROWS)
-            if site_numbers:
-                # Retrieve data from the site_operation_info table by specifying the list of active sites for an IN
-                # specifier
-                self.cur.execute(sql.SQL(
-                    """SELECT * FROM site_operational_info JOIN site ON site_operational_info.site_id = site.id WHERE
-                    site_id IN {} ORDER BY site.ordering""").format(
-                    sql.Literal(site_numbers)))
-                self.SITE_OPERATIONAL_INFO_ROWS = self.cur.fetchall()
-                self.SITE_OPERATIONAL_INFO_COLS = [desc[0] for desc in self.cur.description]
-            else:
-                self.cur.execute("SELECT * FROM site_operational_info LIMIT 0")
-                self.SITE_OPERATIONAL_INFO_ROWS = self.cur.fetchall()
-                self.SITE_OPERATIONAL_INFO_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "SITE_UPLOAD_FILENAMES":
-            self.get_db_rows("SITE")
-            self.SITE_UPLOAD_FILENAMES = []
-            site_numbers = tuple(site[self.SITE_COLS.index('id')] for site in self.SITE_ROWS)
-            for number in site_numbers:
-                self.cur.execute(
-                    """SELECT filename_out FROM pdf_uploads WHERE proposal_id = %s AND form_type = 'SSF' AND
-                    site_id = %s""", (self.PROPOSAL_ID, number))
-                self.SITE_UPLOAD_FILENAMES.append(get_safely(self.cur.fetchone(), 0))
-
-        elif table == "SITE_MEASUREMENTS":
-            self.get_db_rows("SITE")
-            site_numbers = tuple(site[self.SITE_COLS.index('id')] for site in self.SITE_ROWS)
-            if site_numbers:
-                self.cur.execute(sql.SQL(
-                    "SELECT * FROM site_measurements JOIN site ON site_measurements.site_id = site.id WHERE site_id IN {} ORDER BY site.ordering").format(
-                    sql.Literal(site_numbers)))
-                self.SITE_MEASUREMENTS_ROWS = self.cur.fetchall()
-                self.SITE_MEASUREMENTS_COLS = [desc[0] for desc in self.cur.description]
+        if self.cur is not None:
+            self.cur.close()
+        if self.conn_context is not None:
+            self.conn_context.__exit__(None, None, None)
+            self.conn_context = None
+
+
+    def render_sections(self, renderers):
+        """
+        Run a set of independent section renderers (e.g. generate_coversheet_page_full and generate_site_forms_full)
+        and convert each section they produce to its own PDF. A section whose templates and tag values are unchanged
+        since it was last converted is copied out of the section cache instead (see section_cache.py) so only the
+        sections that changed go through Word and LibreOffice. Those sections are generated concurrently on a thread
+        pool. Each one writes its own files, so the only thing they share is the data read through `data`. All of that
+        data is fetched in a single round trip before any section starts (the database cursor isn't shared between
+        threads).
+        :param renderers: This is a list of bound generate_* methods of this object. Every method must have an entry in
+        SECTION_RENDERERS.
+        :return: A list of str paths to the PDF of every section in the order they appear in the proposal PDF.
+        """
+        self.data.prefetch(FRAME_QUERIES + [query for renderer in renderers for query in SECTION_RENDERERS[renderer.__name__][1]])
+
+        section_pdfs = []
+        missed = []  # 3-tuples of the section, its cache key and the path its PDF is written to.
+        for section in self.get_sections(renderers):
+            key = section_cache_key(section["templates"], section["values"])
+            pdf_path = join(self.PROPOSAL_DIR, "TEMP_section_" + section["name"] + ".pdf")
+            if section_cache_get(key, pdf_path):
+                print("-USING CACHED " + section["label"] + "-")
             else:
-                self.cur.execute("SELECT * FROM site_measurements LIMIT 0")
-                self.SITE_MEASUREMENTS_ROWS = self.cur.fetchall()
-                self.SITE_MEASUREMENTS_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "SITE_LITHOS":
-            self.get_db_rows("SITE")
-            site_numbers = tuple(site[self.SITE_COLS.index('id')] for site in self.SITE_ROWS)
-            # We collect the SITE_LITHOS rows differently because we need to ensure that there is exactly one subset of SITE_LITHOS
-            # records (arbitrary length subset but at least one record) for each SITE row. If we just query regularly we won't know
-            # which exact sites are missing SITE_LITHOS records (we only know how many sites total are missing SITE_LITHOS records).
-            self.SITE_LITHOS_COLS = []
-            self.SITE_LITHOS_ROWS = []
-            for i in range(0, len(self.SITE_ROWS)):
-                self.cur.execute(sql.SQL(
-                    "SELECT * FROM site_lithos JOIN site ON site_lithos.site_id = site.id WHERE site_id = %s"),
-                    (site_numbers[i],))
-                if len(self.SITE_LITHOS_COLS) == 0:
-                    self.SITE_LITHOS_COLS = [desc[0] for desc in self.cur.description]
-                result = self.cur.fetchall()
-                # Sort the lithology rows based on the "min-depth" first and resolve ties by then sorting by the "max_depth" column
-                # Empty values should appear after 0 in the listing, so we replace treat null values as being very large numbers.
-                # These large values only control the logic. They won't be displayed in the final document. Note: Null values
-                # shouldn't be appearing anyway because this input should be enforced and check client-side but it's good to be
-                # aware of this anyway.
-                if len(result) != 0:
-                    self.SITE_LITHOS_ROWS.extend(sorted(result, key=lambda x: (
-                        docx_format_number(x[self.SITE_LITHOS_COLS.index('min_depth')], 99999999),
-                        docx_format_number(x[self.SITE_LITHOS_COLS.index('max_depth')], 99999999))))
+                missed.append((section, key, pdf_path))
+            section_pdfs.append(pdf_path)
+
+        if any(section["framed"] for section, _, _ in missed):
+            self.generate_section_frame()
+
+        with ThreadPoolExecutor(max_workers=max(min(len(missed), os.cpu_count() or 1), 1)) as pool:
+            futures = []
+            for section, key, pdf_path in missed:
+                print("-GENERATING " + section["label"] + "-")
+                futures.append(submit_in_context(pool, self.generate_section, section, key, pdf_path))
+            # Wait for every section and re-raise the first exception (if any) in this thread.
+            for future in futures:
+                future.result()
+
+        return section_pdfs
+
+
+    def get_sections(self, renderers):
+        """
+        Split the output of a set of section renderers into the sections that are converted to PDF (and cached)
+        separately. Every renderer produces one section except for the site form renderers which produce one section
+        per site.
+        :param renderers: This is a list of bound generate_* methods of this object.
+        :return: A list of dicts in the order the sections appear in the PDF. Each dict has the keys `name` (a str used
+        to name the section's files), `label` (a str printed when the section is generated), `render` (a callable that
+        writes the section's Word documents), `documents` (a list of str paths to those Word documents in order),
+        `framed` (True if the documents are composed onto the frame from `generate_section_frame`), `templates` (a list
+        of str paths to every template the section is filled from) and `values` (all data filled into the templates).
+        """
+        coversheet_tags = self.get_coversheet_tags()
+        frame_values = {tag: coversheet_tags[tag] for tag in FRAME_TAGS}
+        frame_template = join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx")
+
+        sections = []
+        for renderer in renderers:
+            name = renderer.__name__
+            label = SECTION_RENDERERS[name][0]
+
+            if name in COVERSHEET_TEMPLATES:
+                templates = [join(self.PDF_GEN_DIR, filename) for filename in COVERSHEET_TEMPLATES[name]]
+                sections.append({
+                    "name": "coversheet", "label": label, "render": renderer, "framed": False,
+                    "documents": [join(self.PROPOSAL_DIR, "TEMP_" + filename) for filename in COVERSHEET_TEMPLATES[name]],
+                    "templates": templates,
+                    "values": {"coversheet": select_template_tags(coversheet_tags, templates),
+                               "conditional": self.get_conditional_template_tags()},
+                })
+
+            elif name == "generate_proposed_sites_page":
+                sections.append({
+                    "name": "proposed_sites", "label": label, "render": renderer, "framed": True,
+                    "documents": [join(self.PROPOSAL_DIR, "TEMP_iodp_proposal_pdf_proposed_sites_template.docx")],
+                    "templates": [frame_template, join(self.PDF_GEN_DIR, "iodp_proposal_pdf_proposed_sites_template.docx")],
+                    "values": {"frame": frame_values, "tags": self.get_proposed_sites_tags(), "site": self.data.site.rows,
+                               "site_operational_info": self.data.site_operational_info.rows},
+                })
+
+            elif name == "generate_proponents_page":
+                sections.append({
+                    "name": "proponents", "label": label, "render": renderer, "framed": True,
+                    "documents": [join(self.PROPOSAL_DIR, "TEMP_iodp_proposal_pdf_proponent_list_template.docx")],
+                    "templates": [frame_template, join(self.PDF_GEN_DIR, "iodp_proposal_pdf_proponent_list_template.docx")],
+                    "values": {"frame": frame_values, "tags": self.get_proponents_list_tags(),
+                               "proponent": self.data.proponent.rows,
+                               "coversheet_proponent_map": self.data.coversheet_proponent_map.rows},
+                })
+
+            elif name == "generate_safety_review_prep_page":
+                sections.append({
+                    "name": "safety_review_prep", "label": label, "render": renderer, "framed": True,
+                    "documents": [join(self.PROPOSAL_DIR, "TEMP_iodp_proposal_pdf_safety_review_prep_template.docx")],
+                    "templates": [frame_template, join(self.PDF_GEN_DIR, "iodp_proposal_pdf_safety_review_prep_template.docx")],
+                    "values": {"frame": frame_values, "tags": self.generate_srr_checklist_page()},
+                })
+
+            elif name == "generate_site_forms_full" or name == "generate_site_forms_pre":
+                if name == "generate_site_forms_full":
+                    filenames = SITE_FORM_TEMPLATES_FULL
+                    site_tags = ChainMap(self.get_environmental_protection_tags(), self.get_site_survey_tags(),
+                                         self.get_general_site_info_tags())
                 else:
-                    # Create dummy site lithos row if this site doesn't have any site lithos records attached to it. We
-                    # do this to ensure that every site has at least 1 lithos record attached to it (even if the record
-                    # has no actual data).
-                    self.SITE_LITHOS_ROWS.append(tuple(['' for i in range(len(self.SITE_LITHOS_COLS))]))
-
-        elif table == "SSO_USERS":
-            self.get_db_rows("PROPOSAL")
-            if self.PROPOSAL_ROW:
-                self.cur.execute("SELECT * FROM sso_users WHERE username=%s",
-                            (get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("user_id"), True),))
-            else:
-                self.cur.execute("SELECT * FROM sso_users LIMIT 0")
-            self.SSO_USERS_ROW = self.cur.fetchone()
-            self.SSO_USERS_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "SITE_DATASET_INFO":
-            self.get_db_rows("SITE")
-            site_numbers = tuple(site[self.SITE_COLS.index('id')] for site in self.SITE_ROWS)
-            if site_numbers:
-                self.cur.execute(sql.SQL(
-                    """SELECT * FROM site_dataset_info JOIN site ON site_dataset_info.site_id = site.id WHERE site_id
-                    IN {} ORDER BY site.ordering""").format(sql.Literal(site_numbers)))
-            else:
-                self.cur.execute("SELECT * FROM site_dataset_info LIMIT 0")
-            self.SITE_DATASET_INFO_ROWS = self.cur.fetchall()
-            self.SITE_DATASET_INFO_COLS = [desc[0] for desc in self.cur.description]
-
-        elif table == "SITE_POLLUTION_SAFETY":
-            self.get_db_rows("SITE")
-            site_numbers = tuple(site[self.SITE_COLS.index('id')] for site in self.SITE_ROWS)
-            if site_numbers:
-                self.cur.execute(sql.SQL(
-                    """SELECT * FROM site_pollution_safety_hazards JOIN site on site_pollution_safety_hazards.site_id =
-                    site.id WHERE site_id IN {} ORDER BY site.ordering""").format(sql.Literal(site_numbers)))
+                    filenames = SITE_FORM_TEMPLATES_PRE
+                    site_tags = self.get_general_site_info_tags()
+                templates = [frame_template] + [join(self.PDF_GEN_DIR, filename) for filename in filenames]
+
+                for i in range(0, len(self.data.site.rows)):
+                    values = {"frame": frame_values, "tags": select_template_tags(site_tags, templates, i)}
+                    if name == "generate_site_forms_full":
+                        values["site_lithos"] = self.data.site_lithos_by_site[self.data.site.rows[i].id]
+                    sections.append({
+                        "name": "site_" + str(i), "label": label + " (SITE " + str(i + 1) + ")",
+                        "render": partial(renderer, [i]), "framed": True,
+                        "documents": [join(self.PROPOSAL_DIR, "SITE_" + str(i * len(filenames) + j) + ".docx")
+                                      for j in range(0, len(filenames))],
+                        "templates": templates,
+                        "values": values,
+                    })
+
             else:
-                self.cur.execute("SELECT * FROM site_pollution_safety_hazards LIMIT 0")
-            self.SITE_POLLUTION_SAFETY_ROWS = self.cur.fetchall()
-            self.SITE_POLLUTION_SAFETY_COLS = [desc[0] for desc in self.cur.description]
+                raise ValueError("The renderer " + name + " doesn't produce any sections.")
 
-        elif table == "SRR_CHECKLIST":
-            self.cur.execute("SELECT * FROM srr_checklist WHERE proposal_id = %s", (self.PROPOSAL_ID,))
-            self.SRR_CHECKLIST_ROW = self.cur.fetchone()
-            self.SRR_CHECKLIST_COLS = [desc[0] for desc in self.cur.description]
+        return sections
+
+
+    def generate_section(self, section, key, output_path):
+        """
+        Generate a section's Word documents, convert them to a PDF and store that PDF in the section cache.
+        :param section: This is a section dict returned by `get_sections`.
+        :param key: This str is the section's cache key.
+        :param output_path: This str is the path the section's PDF is written to.
+        :return: None
+        """
+        section["render"]()
 
+        if section["framed"]:
+            master = Composer_Document(join(self.PROPOSAL_DIR, "TEMP_section_frame.docx"))
+            documents = section["documents"]
         else:
-            raise RuntimeError("An invalid query name was specified.")
+            master = Composer_Document(section["documents"][0])
+            documents = section["documents"][1:]
+        composer_obj = Composer(master)
 
-        # Record that we've performed this query so that we don't do it again needlessly in the future.
-        self.tables_queried.append(table)
+        for i, doc in enumerate(documents):
+            appended = Composer_Document(doc)
+            # Start every document on a new page. The frame's body is empty so the first document of a framed section
+            # goes straight onto the first page.
+            if appended.paragraphs and (i > 0 or not section["framed"]):
+                master.add_page_break()
+            composer_obj.append(appended)
 
+        docx_path = join(self.PROPOSAL_DIR, "TEMP_section_" + section["name"] + ".docx")
+        composer_obj.save(docx_path)
+        docx_convert_word_to_pdf(docx_path, output_path)
+        section_cache_put(key, output_path)
 
-    def get_general_site_info_tags(self):
-        self.get_db_rows("SITE")
-        self.get_db_rows("PROPOSAL")
-        self.get_db_rows("COVERSHEET")
-        self.get_db_rows("SITE_OPERATIONAL_INFO")
-        self.get_db_rows("SITE_MEASUREMENTS")
-        # Return the template dictionary now that all database values have been accessed
 
-        return {
-            'proposal_title': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("title"), True),
-            'proposal_submitted_date': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("submit_date"), True),
-            'previous_drilling': [docx_format_string(site[self.SITE_COLS.index('previous_drilling')]) for site in self.SITE_ROWS],
-            'site_objective': [docx_format_string(site[self.SITE_COLS.index('site_objective')]) for site in self.SITE_ROWS],
-            'name': [site[self.SITE_COLS.index('name')] for site in self.SITE_ROWS],
-            'area': [site[self.SITE_COLS.index('area')] for site in self.SITE_ROWS],
-            'jurisdiction': [site[self.SITE_COLS.index('jurisdiction')] for site in self.SITE_ROWS],
-            'dist_to_land': [site[self.SITE_COLS.index('dist_to_land')] for site in self.SITE_ROWS],
-            'former_sitename': [site[self.SITE_COLS.index('former_sitename')] for site in self.SITE_ROWS],
-            'latitude': [docx_format_number(site[self.SITE_COLS.index('latitude')], val_to_return_if_null='') for site in self.SITE_ROWS],
-            'longitude': [docx_format_number(site[self.SITE_COLS.index('longitude')], val_to_return_if_null='') for site in self.SITE_ROWS],
-            'lat_long': [
-                docx_format_number(site[self.SITE_COLS.index('latitude')], return_str=True, val_to_return_if_null='') + "\n" +
-                docx_format_number(site[self.SITE_COLS.index('longitude')], return_str=True, val_to_return_if_null='') for site in self.SITE_ROWS],
-            'datum': [site[self.SITE_COLS.index('datum')] for site in self.SITE_ROWS],
-            'water_depth': [docx_format_number(site[self.SITE_COLS.index('water_depth')]) for site in self.SITE_ROWS],
-            'is_primary_cb': [site[self.SITE_COLS.index('is_primary')] == 'primary' for site in self.SITE_ROWS],
-            'is_alternate_cb': [site[self.SITE_COLS.index('is_primary')] == 'alternate' for site in self.SITE_ROWS],
-            'site_operational_info.total_days_on_site': [docx_format_number(
-                docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('days_drilling')], val_to_return_if_null=0, return_str=False) +
-                docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('days_logging')], val_to_return_if_null=0, return_str=False),
-                val_to_return_if_null=0) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_shallow_gas_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_shallow_gas')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_seabed_compl_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_seabed_compl')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_shall_water_flow_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_shall_water_flow')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_slide_turb_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_slide_turb')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_hydrotherm_act_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_hydrotherm_act')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_seabed_soft_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_seabed_soft')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_hc_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_hc')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_currents_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_currents')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_ch4h2o_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_ch4h2o')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_abnorm_p_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_abnorm_p')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_fract_zone_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_fract_zone')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_dia_volc_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_dia_volc')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_mm_object_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_mm_object')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_fault_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_fault')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_high_temp_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_high_temp')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_h2s_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_h2s')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_high_dip_angle_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_high_dip_angle')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_ice_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_ice')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_co2_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_co2')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.weather_win': [docx_format_string(site[self.SITE_OPERATIONAL_INFO_COLS.index('weather_win')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_sens_mar_habitat': [docx_format_string(site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_sens_mar_habitat')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.hw_other': [docx_format_string(site[self.SITE_OPERATIONAL_INFO_COLS.index('hw_other')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.days_drilling': [docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('days_drilling')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.days_logging': [docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('days_logging')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_fut': [site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_fut')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_apc_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_apc')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_xcb_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_xcb')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_rcb_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_rcb')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_reentry_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_reentry')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_pcs_cb': [site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_pcs')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.sediment_penetration': [docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('sediment_penetration')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.basement_penetration': [docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('basement_penetration')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.total_sediment': [docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('total_sediment')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.total_penetration': [docx_format_number(site[self.SITE_OPERATIONAL_INFO_COLS.index('total_penetration')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.plan_core': [docx_format_string(site[self.SITE_OPERATIONAL_INFO_COLS.index('plan_core')]) for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_measurement.wl_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('wl_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.mag_susc_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('mag_susc_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.form_img_ac_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('form_img_ac_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.bh_t_p_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('bh_t_p_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.vsp_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('vsp_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.lwd_acc_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('dens_neut_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.neut_poros_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('neut_poros_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.lith_dens_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('lith_dens_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.g_ray_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('g_ray_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.std_acc_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('std_acc_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.form_img_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('form_img_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.check_shot_survey_rel': [site[self.SITE_MEASUREMENTS_COLS.index('check_shot_survey_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.form_t_p_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('form_t_p_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.other_rel': [site[self.SITE_MEASUREMENTS_COLS.index('other')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.other_obj': [site[self.SITE_MEASUREMENTS_COLS.index('other_obj')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_measurement.resist_rel_cb': [site[self.SITE_MEASUREMENTS_COLS.index('resist_rel')] for site in self.SITE_MEASUREMENTS_ROWS],
-            'site_operational_info.sediment_litho': [site[self.SITE_OPERATIONAL_INFO_COLS.index('sediment_litho')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-            'site_operational_info.basement_litho': [site[self.SITE_OPERATIONAL_INFO_COLS.index('basement_litho')] for site in self.SITE_OPERATIONAL_INFO_ROWS],
-        }
+    def generate_section_frame(self):
+        """
+        Generate the Word document that sections other than the coversheet are composed onto. It's the first coversheet
+        template with its body removed so that it only contributes the page setup, header and footer that every page of
+        the proposal PDF gets from the coversheet.
+        :return: None
+        """
+        doc = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
+        coversheet_tags = self.get_coversheet_tags()
+        docx_search_and_replace_tags(doc, {tag: coversheet_tags[tag] for tag in FRAME_TAGS})
+        body = doc.element.body
+        for element in list(body):
+            if not element.tag.endswith("}sectPr"):  # Keep the section properties (page size, margins, header, ...)
+                body.remove(element)
+        doc.save(join(self.PROPOSAL_DIR, "TEMP_section_frame.docx"))
+
+
+    @memoize_tags(*GENERAL_SITE_INFO_TAGS.queries)
+    def get_general_site_info_tags(self):
+        return GENERAL_SITE_INFO_TAGS(self.data)
 
 
+    @memoize_tags(*SITE_SURVEY_TAGS.queries)
     def get_site_survey_tags(self):
-        self.get_db_rows("PROPOSAL")
-        self.get_db_rows("SITE_DATASET_INFO")
-        return {
-            'proposal_number': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_number"), True),
-            'proposal_type_name': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_type"), True),
-            'proposal_version': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("vers"), True),
-            'site_dataset_info.primary_hrsr_will_upload': [site[self.SITE_DATASET_INFO_COLS.index('primary_hrsr_will_upload')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.crossing_hrsr_will_upload': [site[self.SITE_DATASET_INFO_COLS.index('crossing_hrsr_will_upload')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.primary_dpsr_will_upload': [site[self.SITE_DATASET_INFO_COLS.index('primary_dpsr_will_upload')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.crossing_dpsr_will_upload': [site[self.SITE_DATASET_INFO_COLS.index('crossing_dpsr_will_upload')] for site in self.SITE_DATASET_INFO_ROWS],
-
-            'site_dataset_info.primary_hrsr_loc_pos_descp': [
-                docx_format_seismic_reflection_data(
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_hrsr_location')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_hrsr_position')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_hrsr_position_type')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_hrsr_description')]
-                ) for i in range(0, len(self.SITE_DATASET_INFO_ROWS))],
-
-            'site_dataset_info.crossing_hrsr_loc_pos_descp': [
-                docx_format_seismic_reflection_data(
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_hrsr_location')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_hrsr_position')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_hrsr_position_type')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_hrsr_description')]
-                ) for i in range(0, len(self.SITE_DATASET_INFO_ROWS))],
-
-            'site_dataset_info.primary_dpsr_loc_pos_descp': [
-                docx_format_seismic_reflection_data(
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_dpsr_location')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_dpsr_position')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_dpsr_position_type')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('primary_dpsr_description')]
-                ) for i in range(0, len(self.SITE_DATASET_INFO_ROWS))],
-
-            'site_dataset_info.crossing_dpsr_loc_pos_descp': [
-                docx_format_seismic_reflection_data(
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_dpsr_location')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_dpsr_position')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_dpsr_position_type')],
-                    self.SITE_DATASET_INFO_ROWS[i][self.SITE_DATASET_INFO_COLS.index('crossing_dpsr_description')]
-                ) for i in range(0, len(self.SITE_DATASET_INFO_ROWS))],
-            'site_dataset_info.seism_veloc_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('seism_veloc_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.seism_veloc_dsc': [site[self.SITE_DATASET_INFO_COLS.index('seism_veloc_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.seismic_grid_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('seismic_grid_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.seismic_grid_dsc': [site[self.SITE_DATASET_INFO_COLS.index('seismic_grid_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.refraction_surf_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('refraction_surf_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.refraction_surf_dsc': [site[self.SITE_DATASET_INFO_COLS.index('refraction_surf_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.refraction_bottom_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('refraction_bottom_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.refraction_bottom_dsc': [site[self.SITE_DATASET_INFO_COLS.index('refraction_bottom_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.a_3_5_khz_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('a_3_5_khz_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.a_3_5_khz_dsc': [site[self.SITE_DATASET_INFO_COLS.index('a_3_5_khz_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.swath_bathy_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('swath_bathy_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.swath_bathy_dsc': [site[self.SITE_DATASET_INFO_COLS.index('swath_bathy_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.side_look_sonar_surf_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('side_look_sonar_surf_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.side_look_sonar_surf_dsc': [site[self.SITE_DATASET_INFO_COLS.index('side_look_sonar_surf_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.side_look_sonar_bottom_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('side_look_sonar_bottom_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.side_look_sonar_bottom_dsc': [site[self.SITE_DATASET_INFO_COLS.index('side_look_sonar_bottom_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.photo_video_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('photo_video_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.photo_video_dsc': [site[self.SITE_DATASET_INFO_COLS.index('photo_video_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.heat_flow_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('heat_flow_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.heat_flow_dsc': [site[self.SITE_DATASET_INFO_COLS.index('heat_flow_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.magnetics_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('magnetics_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.magnetics_dsc': [site[self.SITE_DATASET_INFO_COLS.index('magnetics_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.gravity_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('gravity_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.gravity_dsc': [site[self.SITE_DATASET_INFO_COLS.index('gravity_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.sedim_cores_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('sedim_cores_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.sedim_cores_dsc': [site[self.SITE_DATASET_INFO_COLS.index('sedim_cores_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.rock_samples_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('rock_samples_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.rock_samples_dsc': [site[self.SITE_DATASET_INFO_COLS.index('rock_samples_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.water_current_data_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('water_current_data_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.water_current_data_dsc': [site[self.SITE_DATASET_INFO_COLS.index('water_current_data_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.ice_cond_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('ice_cond_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.ice_cond_dsc': [site[self.SITE_DATASET_INFO_COLS.index('ice_cond_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.obs_micros_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('obs_micros_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.obs_micros_dsc': [site[self.SITE_DATASET_INFO_COLS.index('obs_micros_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.navigation_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('navigation_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.navigation_dsc': [site[self.SITE_DATASET_INFO_COLS.index('navigation_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.other_in_ssdb': [site[self.SITE_DATASET_INFO_COLS.index('other_in_ssdb')] for site in self.SITE_DATASET_INFO_ROWS],
-            'site_dataset_info.other_dsc': [site[self.SITE_DATASET_INFO_COLS.index('other_dsc')] for site in self.SITE_DATASET_INFO_ROWS],
-        }
+        return SITE_SURVEY_TAGS(self.data)
 
 
+    @memoize_tags(*ENVIRONMENTAL_PROTECTION_TAGS.queries)
     def get_environmental_protection_tags(self):
-        self.get_db_rows("SITE_POLLUTION_SAFETY")
-        return {
-            'site_pollution_safety_hazard.oper_summary': [site[self.SITE_POLLUTION_SAFETY_COLS.index('oper_summary')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.hc_dsdp_odp': [site[self.SITE_POLLUTION_SAFETY_COLS.index('hc_dsdp_odp')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.hc_com': [site[self.SITE_POLLUTION_SAFETY_COLS.index('hc_com')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.ch4h2o': [site[self.SITE_POLLUTION_SAFETY_COLS.index('ch4h2o')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.hc_accum': [site[self.SITE_POLLUTION_SAFETY_COLS.index('hc_accum')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.precaut_sp': [site[self.SITE_POLLUTION_SAFETY_COLS.index('precaut_sp')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.aband_proc': [site[self.SITE_POLLUTION_SAFETY_COLS.index('aband_proc')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.mm_hazards': [site[self.SITE_POLLUTION_SAFETY_COLS.index('mm_hazards')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-            'site_pollution_safety_hazard.major_risk': [site[self.SITE_POLLUTION_SAFETY_COLS.index('major_risk')] for site in self.SITE_POLLUTION_SAFETY_ROWS],
-        }
+        return ENVIRONMENTAL_PROTECTION_TAGS(self.data)
 
 
+    @memoize_tags("proponent", *COVERSHEET_TAGS.queries)
     def get_coversheet_tags(self):
-        self.get_db_rows("PROPOSAL")
-        self.get_db_rows("COVERSHEET")
-        self.get_db_rows("PROPONENT")
-        self.get_db_rows("LEAD_PROPONENT")
-        return {
-            'generated_date': self.footer_text,
-            'proposal_number': docx_format_string(get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_number"), True)),
-            'proposal_type_name': docx_format_string(get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_type"), True)),
-            'proposal_version': docx_format_string(get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("vers"), True)),
-            'proponent_names': ', '.join(map(str, [self.PROPONENT_ROWS[i][self.PROPONENT_COLS.index('first')] + ' ' + self.PROPONENT_ROWS[i][self.PROPONENT_COLS.index('last')] for i in range(0, len(self.PROPONENT_ROWS))])),
-            'principal_lead_name': get_safely(self.LEAD_PROPONENT_ROW, self.LEAD_PROPONENT_COLS.index("first"), True) + " " + get_safely(self.LEAD_PROPONENT_ROW, self.LEAD_PROPONENT_COLS.index("last"), True),
-            'principal_lead_affiliation': get_safely(self.LEAD_PROPONENT_ROW, self.LEAD_PROPONENT_COLS.index("affiliation"), True),
-            'principal_lead_country': get_safely(self.LEAD_PROPONENT_ROW, self.LEAD_PROPONENT_COLS.index("country"), True),
-            'perm_to_post_cb': (get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("perm_to_post"), True), {'1': 'Yes', '0': 'No'}),
-            'coversheet.title_short': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("title_short"), True),
-            'coversheet.title': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("title"), True),
-            'coversheet.keywords': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("keywords"), True),
-            'coversheet.geo_area': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("geo_area"), True),
-            'coversheet.abstract': docx_format_string(get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("abstract"), True)),
-            'coversheet.objective': docx_format_string(get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("objective"), True)),
-            'coversheet.contact_operator_ans': (get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("contact_operator_ans"), True), {'True': 'Yes', 'False': 'No', 'yes': 'Yes', 'no': 'No'}),
-            'coversheet.non_stnd_measures': docx_format_string(get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("non_stnd_measures"), True)),
-            'coversheet.sci_plain_lang': docx_format_string(get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("sci_plain_lang"), True)),
-            'received_for_date': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("received_for_date"), True),
-            'resubmission_prpsl_num': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("resubmission_prpsl_num"), True),
-            'resubmission_explanation': docx_format_string(get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("resubmission_explanation"), True)),
-        }
+        return ChainMap({
+            'generated_date': '',   # Stamped onto the PDF afterwards (see footer_text).
+            'proponent_names': ', '.join(map(str, [self.data.proponent.rows[i][self.data.proponent.cols.index('first')] + ' ' + self.data.proponent.rows[i][self.data.proponent.cols.index('last')] for i in range(0, len(self.data.proponent.rows))])),
+        }, COVERSHEET_TAGS(self.data))
 
 
+    @memoize_tags("proposal", "site")
     def get_proposed_sites_tags(self):
-        self.get_db_rows("PROPOSAL")
-        self.get_db_rows("SITE")
         return {
-            'proposal_number': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_number"), True),
-            'proposal_type_name': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_type"), True),
-            'proposal_version': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("vers"), True),
-            'total_sites': len(self.SITE_ROWS),
+            'proposal_number': get_safely(self.data.proposal.row, self.data.proposal.cols.index("proposal_number"), True),
+            'proposal_type_name': get_safely(self.data.proposal.row, self.data.proposal.cols.index("proposal_type"), True),
+            'proposal_version': get_safely(self.data.proposal.row, self.data.proposal.cols.index("vers"), True),
+            'total_sites': len(self.data.site.rows),
             'total_primary_sites': len(
-                [site for site in self.SITE_ROWS if "primary" in site[self.SITE_COLS.index('is_primary')]]),
-            'total_alt_sites': len([site for site in self.SITE_ROWS if "alternate" in site[self.SITE_COLS.index('is_primary')]]),
-            'total_ns_sites': len([site for site in self.SITE_ROWS if "not set" in site[self.SITE_COLS.index('is_primary')]]),
+                [site for site in self.data.site.rows if "primary" in site.is_primary]),
+            'total_alt_sites': len([site for site in self.data.site.rows if "alternate" in site.is_primary]),
+            'total_ns_sites': len([site for site in self.data.site.rows if "not set" in site.is_primary]),
         }
 
 
+    @memoize_tags("proposal", "sso_users")
     def get_proponents_list_tags(self):
-        self.get_db_rows("PROPOSAL")
-        self.get_db_rows("SSO_USERS")
         return {
-            'proposal_number': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("proposal_number"), True),
-            'contact_person_full_name': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("firstname"), True) + " " + get_safely(
-                self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("lastname"), True),
-            'contact_person_department': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("department"), True),
-            'contact_person_org': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("organization"), True),
-            'contact_person_addr': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("address"), True),
-            'contact_person_city': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("city"), True),
-            'contact_person_state': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("state"), True),
-            'contact_person_zipcode': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("zipcode"), True),
-            'contact_person_country': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("country"), True),
-            'contact_person_email': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("email"), True),
-            'contact_person_phone': get_safely(self.SSO_USERS_ROW, self.SSO_USERS_COLS.index("phone"), True),
+            'proposal_number': get_safely(self.data.proposal.row, self.data.proposal.cols.index("proposal_number"), True),
+            'contact_person_full_name': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("firstname"), True) + " " + get_safely(
+                self.data.sso_users.row, self.data.sso_users.cols.index("lastname"), True),
+            'contact_person_department': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("department"), True),
+            'contact_person_org': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("organization"), True),
+            'contact_person_addr': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("address"), True),
+            'contact_person_city': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("city"), True),
+            'contact_person_state': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("state"), True),
+            'contact_person_zipcode': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("zipcode"), True),
+            'contact_person_country': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("country"), True),
+            'contact_person_email': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("email"), True),
+            'contact_person_phone': get_safely(self.data.sso_users.row, self.data.sso_users.cols.index("phone"), True),
         }
 
 
+    @memoize_tags("proposal", "coversheet")
     def get_conditional_template_tags(self):
-        self.get_db_rows("PROPOSAL")
-        self.get_db_rows("COVERSHEET")
         return {
-            'new_proposal': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("is_resubmission"), False) == 'true' or get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("resubmission_type"), True) != "",
-            'coversheet.contact_operator_ans': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("contact_operator_ans"),False) is not None,
-            'coversheet.sci_plain_lang': get_safely(self.COVERSHEET_ROW, self.COVERSHEET_COLS.index("sci_plain_lang"), False) is not None,
-            'resubmission_type': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("resubmission_type"),False) == 'from_older_submission',
-            'resubmission_prpsl_num': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("is_resubmission"), False) == 'true',
-            'resubmission_from_declined_proposal': get_safely(self.PROPOSAL_ROW, self.PROPOSAL_COLS.index("resubmission_type"),False) == 'from_declined'
+            'new_proposal': get_safely(self.data.proposal.row, self.data.proposal.cols.index("is_resubmission"), False) == 'true' or get_safely(self.data.proposal.row, self.data.proposal.cols.index("resubmission_type"), True) != "",
+            'coversheet.contact_operator_ans': get_safely(self.data.coversheet.row, self.data.coversheet.cols.index("contact_operator_ans"),False) is not None,
+            'coversheet.sci_plain_lang': get_safely(self.data.coversheet.row, self.data.coversheet.cols.index("sci_plain_lang"), False) is not None,
+            'resubmission_type': get_safely(self.data.proposal.row, self.data.proposal.cols.index("resubmission_type"),False) == 'from_older_submission',
+            'resubmission_prpsl_num': get_safely(self.data.proposal.row, self.data.proposal.cols.index("is_resubmission"), False) == 'true',
+            'resubmission_from_declined_proposal': get_safely(self.data.proposal.row, self.data.proposal.cols.index("resubmission_type"),False) == 'from_declined'
         }
 
 
-    def generate_site_forms_full(self):
+    @memoize_tags("proposal", "coversheet", "site", "site_operational_info", "site_measurements", "site_dataset_info",
+                  "site_pollution_safety")
+    def get_site_forms_full_tags(self):
         """
-        This function generates the full set of site forms including site forms 1, 2, 4, and 5. Each Word document
-        is stored in the directory specified by PROPOSAL_DIR and they are ordered by their names which are 1.docx,
-        2.docx, 3.docx, etc...
-        :return:
+        Get the tags of the full site forms paired with the dicts that map their values to what is displayed. These are
+        built once for all sites since the site forms of every site are generated separately (see get_sections).
+        :return: A LazyTags mapping every tag to a 2-tuple of its value and its display dict.
         """
-        filename0 = "iodp_proposal_pdf_site_info_template0.docx"
-        filename1 = "iodp_proposal_pdf_site_info_template1.docx"
-        filename2 = "iodp_proposal_pdf_site_info_template2.docx"
-        filename3 = "iodp_proposal_pdf_site_survey_template.docx"
-        filename4 = "iodp_proposal_pdf_site_env_protection_template.docx"
-        filename5 = "iodp_proposal_pdf_site_lithologies_template.docx"
-
         # We want to map "True" values to a checkmark emoji so that the checkboxes are displayed with an emoji if true.
         # The hex digits are a utf-8 encoding of a black checkmark emoji.
         site_table_tf_display_dict = {'True': "☑", 'False': "☐", 'None': ''}
@@ -550,94 +421,94 @@ class WordProposalGenerator:
         site_environ_display_dict = {"None": ""}  # Current proposals have a blank field rather than the text "None" so
         # we replace all "None" with the empty string.
 
-        site_form_tags = {}
-        for key, value in self.get_general_site_info_tags().items():
-            site_form_tags[key] = (value, site_table_tf_display_dict)
-
-        site_survey_tags = {}
-        for key, value in self.get_site_survey_tags().items():
-            if isinstance(value, list):  # Format all paragraphs in the "Details of available data..." section
-                value = [docx_format_string(val) for val in value]
-            site_survey_tags[key] = (value, site_survey_tf_display_dict)
-
-        site_environ_tags = {}
-        for key, value in self.get_environmental_protection_tags().items():
-            site_environ_tags[key] = (value, site_environ_display_dict)
-
-        joined_dicts = {**site_form_tags, **site_survey_tags, **site_environ_tags}
-
-        # Get the SITE_LITHOS_ROWS member variable defined so we can read its data.
-        self.get_db_rows("SITE_LITHOS")
-        # Determine which entries of the lithos site table correspond to which site id by creating a list with
-        # indices marking which section of SITE_LITHOS_ROWS corresponds to the first site, which to the second,
-        # and so on...
-        site_lithos_sections = [row[1] for row in self.SITE_LITHOS_ROWS]  # The lithologies are listed in order in accordance
-        # with the site order so indicate where each lithologies section begins and ends for each site of this proposal.
-        # Note that the site lithos records will be already sorted. This was done in the same block that queried them.
-        seen_elements = set()  # This data structure tracks the which sites have had collected all of their lithos records.
-        indices = []  # Indices define the length of the block for a site. Each value indicates the first index of the
-        # next block of lithologies data for that position's corresponding site.
-        if site_lithos_sections:
-            for i, element in enumerate(site_lithos_sections):
-                if element == "":
-                    indices.append(i)  # If at this index the site lithos record is empty that means there were none for
-                    # this site and that a dummy record was inserted so we mark the location of the dummy record.
-                elif element not in seen_elements:
-                    seen_elements.add(element)
-                    indices.append(i)
-            indices.append(len(site_lithos_sections))
-
-        for i in range(0, len(self.SITE_ROWS)):
+        site_form_tags = self.get_general_site_info_tags()
+        site_survey_tags = self.get_site_survey_tags()
+        site_environ_tags = self.get_environmental_protection_tags()
+
+        def compute(tag):
+            if tag in site_environ_tags:
+                return site_environ_tags[tag], site_environ_display_dict
+            if tag in site_survey_tags:
+                value = site_survey_tags[tag]
+                if isinstance(value, list):  # Format all paragraphs in the "Details of available data..." section
+                    value = [docx_format_string(val) for val in value]
+                return value, site_survey_tf_display_dict
+            return site_form_tags[tag], site_table_tf_display_dict
+
+        return LazyTags(list(site_form_tags) + list(site_survey_tags) + list(site_environ_tags), compute)
+
+
+    @memoize_tags("proposal", "coversheet", "site", "site_operational_info", "site_measurements")
+    def get_site_forms_pre_tags(self):
+        """
+        Get the tags of the pre-proposal site forms paired with the dicts that map their values to what is displayed
+        (see `get_site_forms_full_tags`).
+        :return: A LazyTags mapping every tag to a 2-tuple of its value and its display dict.
+        """
+        # We want to map "True" values to a checkmark emoji so that the checkboxes are displayed with an emoji if true.
+        site_table_tf_display_dict = {'True': "☑", 'False': "☐", 'None': ""}
+
+        site_form_tags = self.get_general_site_info_tags()
+        return LazyTags(site_form_tags, lambda tag: (site_form_tags[tag], site_table_tf_display_dict))
+
+
+    def generate_site_forms_full(self, sites=None):
+        """
+        This function generates the full set of site forms including site forms 1, 2, 4, and 5. Each Word document
+        is stored in the directory specified by PROPOSAL_DIR and they are ordered by their names which are 1.docx,
+        2.docx, 3.docx, etc...
+        :param sites: This is an optional list of int site indices (into the site rows) to generate forms for. All sites are
+        generated if it isn't specified.
+        :return:
+        """
+        filename0, filename1, filename2, filename3, filename4, filename5 = SITE_FORM_TEMPLATES_FULL
+        joined_dicts = self.get_site_forms_full_tags()
+
+        for i in (range(0, len(self.data.site.rows)) if sites is None else sites):
             counter = i * 6
-            doc = Document(join(self.PDF_GEN_DIR, filename0))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename0))
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 0) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 0) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename1))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename1))
             docx_define_styles(doc)
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 1) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 1) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename2))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename2))
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 2) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 2) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename3))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename3))
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 3) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 3) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename4))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename4))
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 4) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 4) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename5))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename5))
             docx_define_styles(doc)
             docx_search_and_replace_tags(doc, joined_dicts, i)
             lithologies_data = []
 
-            for j in range(indices[i], indices[i + 1]):  # For every site in a that's associated with this proposal
+            site_lithos_rows = self.data.site_lithos_by_site[self.data.site.rows[i].id]
+            for row in site_lithos_rows:  # For every lithology of this site
                 site_lithos = ()
-                if self.SITE_LITHOS_ROWS[j][1] != '':
-                    site_lithos += (docx_format_number(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('min_depth')], "",
-                                                       True)) + ' - ' + docx_format_number(
-                        self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('max_depth')], "", True),
-                else:
-                    site_lithos += ('N/A',)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('key_event')]),)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('age')]),)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('velocity')]),)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('lithology')]),)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('paleo_env')]),)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('sed_accum')]),)
-                site_lithos += (docx_format_string(self.SITE_LITHOS_ROWS[j][self.SITE_LITHOS_COLS.index('comment')]),)
-                lithologies_data.append(site_lithos)  # Add this site to the list of sites
+                site_lithos += (docx_format_number(row.min_depth, "", True)) + ' - ' + \
+                    docx_format_number(row.max_depth, "", True),
+                site_lithos += (docx_format_string(row.key_event),)
+                site_lithos += (docx_format_string(row.age),)
+                site_lithos += (docx_format_string(row.velocity),)
+                site_lithos += (docx_format_string(row.lithology),)
+                site_lithos += (docx_format_string(row.paleo_env),)
+                site_lithos += (docx_format_string(row.sed_accum),)
+                site_lithos += (docx_format_string(row.comment),)
+                lithologies_data.append(site_lithos)  # Add this lithology to the list of lithologies
+            if not site_lithos_rows:
+                # A site without any lithologies still gets a single (empty) row in its table.
+                lithologies_data.append(('N/A', '', '', '', '', '', '', ''))
             docx_build_table(doc, 0, lithologies_data)
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 5) + '.docx'))
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 5) + '.docx'))
 
 
@@ -645,11 +516,11 @@ class WordProposalGenerator:
         COVERSHEET_TAGS = self.get_coversheet_tags()
         CONDITIONAL_TEMPLATE_TAGS = self.get_conditional_template_tags()
 
-        doc0 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
-        doc1 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template1.docx"))
-        doc2 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template2.docx"))
-        doc3 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template3.docx"))
-        doc4 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template4.docx"))
+        doc0 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
+        doc1 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template1.docx"))
+        doc2 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template2.docx"))
+        doc3 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template3.docx"))
+        doc4 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template4.docx"))
 
         docx_search_and_replace_tags(doc0, COVERSHEET_TAGS)
         docx_redact_conditional(doc0, CONDITIONAL_TEMPLATE_TAGS)
@@ -673,9 +544,9 @@ class WordProposalGenerator:
         COVERSHEET_TAGS = self.get_coversheet_tags()
         CONDITIONAL_TEMPLATE_TAGS = self.get_conditional_template_tags()
 
-        doc0 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
-        doc1 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template1.docx"))
-        doc2 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template2_leap.docx"))
+        doc0 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
+        doc1 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template1.docx"))
+        doc2 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template2_leap.docx"))
 
         docx_search_and_replace_tags(doc0, COVERSHEET_TAGS)
         docx_redact_conditional(doc0, CONDITIONAL_TEMPLATE_TAGS)
@@ -693,10 +564,10 @@ class WordProposalGenerator:
         COVERSHEET_TAGS = self.get_coversheet_tags()
         CONDITIONAL_TEMPLATE_TAGS = self.get_conditional_template_tags()
 
-        doc0 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
-        doc1 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template1.docx"))
-        doc2 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template2_leap.docx"))
-        doc3 = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template4_leap.docx"))
+        doc0 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template0.docx"))
+        doc1 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template1.docx"))
+        doc2 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template2_leap.docx"))
+        doc3 = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_coversheet_template4_leap.docx"))
 
         docx_search_and_replace_tags(doc0, COVERSHEET_TAGS)
         docx_redact_conditional(doc0, CONDITIONAL_TEMPLATE_TAGS)
@@ -715,22 +586,20 @@ class WordProposalGenerator:
 
 
     def generate_proponents_page(self):
-        self.get_db_rows("PROPONENT")
-        self.get_db_rows("COVERSHEET_PROPONENT_MAP")
-        doc = Document(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_proponent_list_template.docx"))
+        doc = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_proponent_list_template.docx"))
         PROPONENTS_LIST_TAGS = self.get_proponents_list_tags()
         docx_define_styles(doc)
         docx_search_and_replace_tags(doc, PROPONENTS_LIST_TAGS)
         proponents_data = []
-        if self.PROPONENT_ROWS:
-            for i in range(0, len(self.PROPONENT_ROWS)):  # For every site in a that's associated with this proposal
+        if self.data.proponent.rows:
+            for i in range(0, len(self.data.proponent.rows)):  # For every site in a that's associated with this proposal
                 proponent = ()
-                proponent += (docx_format_string(self.PROPONENT_ROWS[i][self.PROPONENT_COLS.index('first')]),)
-                proponent += (docx_format_string(self.PROPONENT_ROWS[i][self.PROPONENT_COLS.index('last')]),)
-                proponent += (docx_format_string(self.PROPONENT_ROWS[i][self.PROPONENT_COLS.index('affiliation')]),)
-                proponent += (docx_format_string(self.PROPONENT_ROWS[i][self.PROPONENT_COLS.index('country')]),)
-                proponent += (docx_format_string(self.COVERSHEET_PROPONENT_MAP_ROWS[i][self.COVERSHEET_PROPONENT_MAP_COLS.index('role')]),)
-                proponent += (docx_format_string(self.COVERSHEET_PROPONENT_MAP_ROWS[i][self.COVERSHEET_PROPONENT_MAP_COLS.index('expertise')]),)
+                proponent += (docx_format_string(self.data.proponent.rows[i][self.data.proponent.cols.index('first')]),)
+                proponent += (docx_format_string(self.data.proponent.rows[i][self.data.proponent.cols.index('last')]),)
+                proponent += (docx_format_string(self.data.proponent.rows[i][self.data.proponent.cols.index('affiliation')]),)
+                proponent += (docx_format_string(self.data.proponent.rows[i][self.data.proponent.cols.index('country')]),)
+                proponent += (docx_format_string(self.data.coversheet_proponent_map.rows[i][self.data.coversheet_proponent_map.cols.index('role')]),)
+                proponent += (docx_format_string(self.data.coversheet_proponent_map.rows[i][self.data.coversheet_proponent_map.cols.index('expertise')]),)
                 proponents_data.append(proponent)  # Add this site to the list of sites
         else:
             proponents_data = [("N/A", "", "", "", "", "")]
@@ -738,126 +607,124 @@ class WordProposalGenerator:
         doc.save(join(self.PROPOSAL_DIR, "TEMP_iodp_proposal_pdf_proponent_list_template.docx"))
 
 
+    @memoize_tags("srr_checklist")
     def generate_srr_checklist_page(self):
-        self.get_db_rows("SRR_CHECKLIST")
         return {
             "srr_checklist.q1": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q1")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q1")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q2": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q2")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q2")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q3": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q3")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q3")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q4": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q4")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q4")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q5": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q5")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q5")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q6": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q6")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q6")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q7": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q7")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q7")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q8": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q8")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q8")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q9": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q9")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q9")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q10": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q10")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q10")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q11": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q11")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q11")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q12": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q12")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q12")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q13": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q13")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q13")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q14": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q14")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q14")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q15": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q15")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q15")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q16": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q16")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q16")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q17": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q17")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q17")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q18": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q18")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q18")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q19": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q19")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q19")),
                 {"0": "No", "1": "Yes"}
             ),
             "srr_checklist.q20": (
-                get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("q20")),
+                get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("q20")),
                 {"0": "No", "1": "Yes"}
             ),
-            "srr_checklist.comments": get_safely(self.SRR_CHECKLIST_ROW, self.SRR_CHECKLIST_COLS.index("comments")),
+            "srr_checklist.comments": get_safely(self.data.srr_checklist.row, self.data.srr_checklist.cols.index("comments")),
         }
 
 
     def generate_proposed_sites_page(self):
-        self.get_db_rows("SITE")
-        self.get_db_rows("SITE_OPERATIONAL_INFO")
-        doc = Document(self.PDF_GEN_DIR + "iodp_proposal_pdf_proposed_sites_template.docx")
+        doc = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_proposed_sites_template.docx"))
         docx_define_styles(doc)
         docx_search_and_replace_tags(doc, self.get_proposed_sites_tags())
         proposed_sites_table_parsed = []
-        if self.SITE_ROWS:
-            for i in range(0, len(self.SITE_ROWS)):  # For every site in a that's associated with this proposal
+        if self.data.site.rows:
+            for i in range(0, len(self.data.site.rows)):  # For every site in a that's associated with this proposal
                 site = ()
-                site += (get_safely(get_safely(self.SITE_ROWS, i), self.SITE_COLS.index('name')) + " " +
-                     str(get_safely(get_safely(self.SITE_ROWS, i), self.SITE_COLS.index('is_primary'))),)
-                site += (docx_format_number(get_safely(get_safely(self.SITE_ROWS, i), self.SITE_COLS.index('latitude')),
+                site += (get_safely(get_safely(self.data.site.rows, i), self.data.site.cols.index('name')) + " " +
+                     str(get_safely(get_safely(self.data.site.rows, i), self.data.site.cols.index('is_primary'))),)
+                site += (docx_format_number(get_safely(get_safely(self.data.site.rows, i), self.data.site.cols.index('latitude')),
                     val_to_return_if_null='', return_str=True) + "\n" +
-                    docx_format_number(get_safely(get_safely(self.SITE_ROWS, i), self.SITE_COLS.index('longitude')),
+                    docx_format_number(get_safely(get_safely(self.data.site.rows, i), self.data.site.cols.index('longitude')),
                     val_to_return_if_null='', return_str=True),)
                 site += (
-                    docx_format_number(get_safely(get_safely(self.SITE_ROWS, i), self.SITE_COLS.index('water_depth')),
+                    docx_format_number(get_safely(get_safely(self.data.site.rows, i), self.data.site.cols.index('water_depth')),
                     val_to_return_if_null=0, return_str=True),)
                 site += (
-                    docx_format_number(get_safely(get_safely(self.SITE_OPERATIONAL_INFO_ROWS, i),
-                    self.SITE_OPERATIONAL_INFO_COLS.index('sediment_penetration')),
+                    docx_format_number(get_safely(get_safely(self.data.site_operational_info.rows, i),
+                    self.data.site_operational_info.cols.index('sediment_penetration')),
                     val_to_return_if_null=0, return_str=True),)
                 site += (
-                    docx_format_number(get_safely(get_safely(self.SITE_OPERATIONAL_INFO_ROWS, i),
-                    self.SITE_OPERATIONAL_INFO_COLS.index("basement_penetration")),
+                    docx_format_number(get_safely(get_safely(self.data.site_operational_info.rows, i),
+                    self.data.site_operational_info.cols.index("basement_penetration")),
                     val_to_return_if_null=0, return_str=True),)
                 site += (
-                    docx_format_number(get_safely(get_safely(self.SITE_OPERATIONAL_INFO_ROWS, i),
-                    self.SITE_OPERATIONAL_INFO_COLS.index('total_penetration')),
+                    docx_format_number(get_safely(get_safely(self.data.site_operational_info.rows, i),
+                    self.data.site_operational_info.cols.index('total_penetration')),
                     val_to_return_if_null=0, return_str=True),)
-                site += (docx_format_string(get_safely(get_safely(self.SITE_ROWS, i),
-                    self.SITE_COLS.index('site_objective'))),)
+                site += (docx_format_string(get_safely(get_safely(self.data.site.rows, i),
+                    self.data.site.cols.index('site_objective'))),)
                 proposed_sites_table_parsed.append(site)  # Add this site to the list of sites
         else:
             # Insert a dummy row if there are no sites to list.
@@ -867,18 +734,20 @@ class WordProposalGenerator:
 
 
     def get_page_identifiers(self):
-        self.get_db_rows("COVERSHEET")
-        header_text = self.get_coversheet_tags()['proposal_number'] + "-" + self.get_coversheet_tags()[
-            'proposal_type_name'] + self.get_coversheet_tags()['proposal_version']
-        # Because we are converting to PDF only once there's no point where we can inspect the number of pages of each
-        # section individually. Thus the way we determine where the coversheet ends and proposed sites begins, for example,
-        # is by inspecting text dumps for each page in output PDF and checking if those match specified sections from
-        # each section. When we get a match then we know which section we are on in the for loop and bookmark the section
-        # accordingly. The problem with this is that if we change things in the templates docx files we will need to be
-        # sure to update the identifier variables here in the case that they change and no longer appear in the PDF.
+        coversheet_tags = self.get_coversheet_tags()
+        header_text = coversheet_tags['proposal_number'] + "-" + coversheet_tags['proposal_type_name'] + \
+            coversheet_tags['proposal_version']
+        # Each section is converted to its own PDF (see render_sections) but a section can hold several bookmarked forms
+        # (a site's general information, survey, environmental protection and lithology forms) and blank pages that have
+        # to be dropped. So the pages are still told apart by inspecting the text dump of each page of the merged PDF
+        # and checking it against the identifiers below. When we get a match then we know which form we are on and
+        # bookmark it accordingly. The problem with this is that if we change things in the templates docx files we will
+        # need to be sure to update the identifier variables here in the case that they change and no longer appear in
+        # the PDF.
         return {
             "header_text_identifier": header_text,
             "coversheet_page_identifier": header_text + "\nIODP Proposal Coversheet",
+            # The footer is stamped onto the merged pages before they're inspected (see merge_pdf_files).
             "empty_page_identifier": header_text + "\n" + self.footer_text,
             "proposed_sites_page_identifier": header_text + "\nProposed Sites\n(Total proposed sites:",
             "proposed_sites_page_continued_identifier": header_text + "\nSite NamePosition\n(Lat, Lon)Water",
@@ -916,42 +785,33 @@ class WordProposalGenerator:
                 os.remove(file_path)
 
 
-    def generate_site_forms_pre(self):
-        filename0 = "iodp_proposal_pdf_site_info_template0.docx"
-        filename1 = "iodp_proposal_pdf_site_info_template1.docx"
-        filename2 = "iodp_proposal_pdf_site_info_template2.docx"
-
-        # We want to map "True" values to a checkmark emoji so that the checkboxes are displayed with an emoji if true.
-        site_table_tf_display_dict = {'True': "☑", 'False': "☐", 'None': ""}
-
-        site_form_tags = {}
-        for key, value in self.get_general_site_info_tags().items():
-            site_form_tags[key] = (value, site_table_tf_display_dict)
-
-        joined_dicts = {**site_form_tags}
+    def generate_site_forms_pre(self, sites=None):
+        """
+        This function generates the site forms of a pre-proposal (the general site information forms only).
+        :param sites: This is an optional list of int site indices (into the site rows) to generate forms for. All sites are
+        generated if it isn't specified.
+        :return: None
+        """
+        filename0, filename1, filename2 = SITE_FORM_TEMPLATES_PRE
+        joined_dicts = self.get_site_forms_pre_tags()
 
-        self.get_db_rows("SITE")
-        self.get_db_rows("PROPOSAL")
-        for i in range(0, len(self.SITE_ROWS)):
+        for i in (range(0, len(self.data.site.rows)) if sites is None else sites):
             counter = i * 3
-            doc = Document(join(self.PDF_GEN_DIR, filename0))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename0))
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 0) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 0) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename1))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename1))
             docx_define_styles(doc)
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 1) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 1) + '.docx'))
 
-            doc = Document(join(self.PDF_GEN_DIR, filename2))
+            doc = docx_load_template(join(self.PDF_GEN_DIR, filename2))
             docx_search_and_replace_tags(doc, joined_dicts, i)
             doc.save(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 2) + '.docx'))
-            self.site_file_names.append(join(self.PROPOSAL_DIR, 'SITE_' + str(counter + 2) + '.docx'))
 
 
     def generate_safety_review_prep_page(self):
-        doc = Document(self.PDF_GEN_DIR + "iodp_proposal_pdf_safety_review_prep_template.docx")
+        doc = docx_load_template(join(self.PDF_GEN_DIR, "iodp_proposal_pdf_safety_review_prep_template.docx"))
         docx_search_and_replace_tags(doc, self.generate_srr_checklist_page())
         doc.save(join(self.PROPOSAL_DIR, "TEMP_iodp_proposal_pdf_safety_review_prep_template.docx"))
\ No newline at end of file
@@ -0,0 +1,398 @@
+from decouple import config
+from os.path import join
+from pdf_gen_helper_functions import (validate_path, redirect_output_to_log, redirect_output_to_stream,
+                                     docx_template_digest, db_execute_prepared)
+from WordProposalGenerator import WordProposalGenerator, SECTION_RENDERERS
+from proposal_data import BULK_QUERY, BULK_TABLES
+from section_cache import RENDERER_VERSION
+from concurrent.futures import Future
+from contextlib import contextmanager
+import controller_drilling
+import controller_leaps
+import fcntl
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import traceback
+
+DRILLING_TYPES = ["Full", "APL", "Pre", "Add", "CPP", "SRR"]
+LEAP_TYPES = ["Pre-LEAP", "Full-LEAP"]
+
+PDF_LOG_FILE = "pdf_gen_logs.txt"
+
+# The fingerprint and probe token (see `get_proposal_fingerprint` and `get_probe_token`) of the inputs of an output PDF
+# are recorded as JSON in a file named <output filename> + this suffix next to it.
+FINGERPRINT_SUFFIX = ".fingerprint"
+
+# Only one generation of a proposal runs at a time (across all processes) since every run writes its intermediate files
+# to the same directory. A run holds an flock on this file in the proposal's directory while it generates. The kernel
+# releases the lock when its holder exits, however it exits, so a killed run never leaves a stale lock behind.
+GENERATION_LOCK_NAME = "generation.lock"
+
+# Generations running in this process keyed by (proposal id, coversheet only, output filename, force). Each value is a
+# Future that resolves to the result of the generation, so that identical requests that arrive while it's running (the
+# daemon handles requests on concurrent threads) share it instead of generating the proposal again. A forced request
+# never shares a normal run, which may keep the existing PDF. It waits for that run's lock and then generates.
+_IN_FLIGHT = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+
+# This query summarises every row that the controllers can read for a proposal in a single value. Postgres sets a row's
+# xmin to the id of the transaction that inserted it or last updated it. So if any of the rows is inserted, updated or
+# deleted then the aggregated list of xmins changes. Each table's list is wrapped in coalesce() so an empty table keeps
+# its place in the list.
+PROBE_QUERY = """
+SELECT concat_ws('|',
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM proposal t
+              WHERE t.id = %(id)s), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM coversheet t
+              WHERE t.proposal_id = %(id)s), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM coversheet_proponent_map t
+              WHERE t.proposal_id = %(id)s), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM proponent t
+              WHERE t.id IN (SELECT proponent_id FROM coversheet_proponent_map WHERE proposal_id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM sso_users t
+              WHERE t.username = (SELECT user_id FROM proposal WHERE id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM site t
+              WHERE t.proposal_id = %(id)s), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM site_operational_info t
+              WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM site_measurements t
+              WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM site_lithos t
+              WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM site_dataset_info t
+              WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM site_pollution_safety_hazards t
+              WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM srr_checklist t
+              WHERE t.proposal_id = %(id)s), ''),
+    coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.xmin::text) FROM pdf_uploads t
+              WHERE t.proposal_id = %(id)s), '')
+)
+"""
+
+
+# Run BULK_QUERY and PROBE_QUERY for a whole batch of proposals in a single statement (see prefetch_proposal_data).
+# Both are evaluated in the same snapshot so the probe token always describes exactly the rows that were fetched.
+BATCH_PREFETCH_QUERY = """
+SELECT batch_proposal.id::text, (%s), (%s)
+FROM proposal batch_proposal WHERE batch_proposal.id::text = ANY(%%(ids)s)
+""" % (BULK_QUERY.replace("%(id)s", "batch_proposal.id"), PROBE_QUERY.replace("%(id)s", "batch_proposal.id"))
+
+
+def prefetch_proposal_data(conn, proposal_ids):
+    """
+    Fetch the database rows of many proposals at once so that a batch run doesn't query each proposal separately.
+    :param conn: This is an open psycopg2 connection.
+    :param proposal_ids: This is a list of str proposal ids.
+    :return: A dict mapping every proposal id that exists to a dict with the keys `rows` (its BULK_QUERY result, see
+    the `prefetched_rows` parameter of ProposalData) and `probe` (its PROBE_QUERY result). The dict only holds
+    strs so it's cheap to send to a worker process.
+    """
+    with conn.cursor() as cur:
+        cur.execute(BATCH_PREFETCH_QUERY, {"ids": list(proposal_ids), "tables": BULK_TABLES})
+        return {proposal_id: {"rows": rows, "probe": probe} for proposal_id, rows, probe in cur.fetchall()}
+
+
+def get_proposal_row(conn, proposal_id):
+    """
+    Read the proposal's row from the proposal table.
+    :param conn: This is an open psycopg2 connection.
+    :param proposal_id: This str is the id of the proposal.
+    :return: A 2-tuple where the first element is the proposal row and the second element is the list of columns.
+    """
+    with conn.cursor() as cur:
+        db_execute_prepared(cur, "pdf_gen_proposal", "SELECT * FROM proposal WHERE id = %s", (proposal_id,))
+        return cur.fetchone(), [desc[0] for desc in cur.description]
+
+
+def get_controller(proposal_type):
+    """
+    Get the controller that generates the PDFs of a proposal type.
+    :param proposal_type: This str is the proposal_type of the proposal.
+    :return: A 2-tuple where the first element is the controller module and the second element is its generate function.
+    """
+    if proposal_type in DRILLING_TYPES:
+        return controller_drilling, controller_drilling.generate_drilling_pdf
+    elif proposal_type in LEAP_TYPES:
+        return controller_leaps, controller_leaps.generate_leap_pdf
+    raise ValueError("This proposal type is not yet supported for PDF generation.")
+
+
+def get_pdf_log_path(proposal_id):
+    """
+    Get the path to the log file that PDF generation output for a proposal is written to. The directory is created if
+    it doesn't exist yet.
+    :param proposal_id: This str is the id of the proposal.
+    :return: A str path to the log file.
+    """
+    proposal_dir = validate_path(join(validate_path(config("PROPOSALS_BASE_DIR")), proposal_id))
+    return join(validate_path(join(proposal_dir, "pdf_logs")), PDF_LOG_FILE)
+
+
+def get_proposal_fingerprint(obj, controller, p_type, c_only, output_name):
+    """
+    Compute a fingerprint of everything that goes into a proposal's PDF: every database row the controller reads, the
+    size and modification time of every user upload, every Word template, the renderer version and the command line
+    options. All the queries are run through `obj.data` in a single round trip (see `ProposalData.prefetch`) so the
+    controller can reuse their results.
+    :param obj: This is the WordProposalGenerator of the proposal.
+    :param controller: This is the controller module (controller_drilling or controller_leaps) for the proposal type.
+    :param p_type: This str is the proposal type.
+    :param c_only: This bool tells the controller to produce only the coversheet.
+    :param output_name: This optional str is the filename of the output PDF.
+    :return: A str sha256 hex digest.
+    """
+    queries = ["proposal"]
+    for renderer in controller.get_section_renderers(obj, p_type, c_only):
+        queries += SECTION_RENDERERS[renderer.__name__][1]
+    obj.data.prefetch(queries if c_only else queries + ["pdf_uploads"])
+
+    data = {query: getattr(obj.data, query) for query in queries}
+
+    # The uploads are identified by the size and modification time recorded in the upload index rather than hashed so
+    # that large uploads aren't read.
+    uploads = {}
+    if not c_only:
+        for (form_type, site_id), upload in obj.data.pdf_uploads.items():
+            uploads["%s:%s" % (form_type, site_id)] = upload
+
+    templates = {os.path.basename(path): docx_template_digest(path)
+                 for path in sorted(glob.glob(join(obj.PDF_GEN_DIR, "iodp_proposal_pdf_*.docx")))}
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"renderer_version": RENDERER_VERSION,
+                              "options": {"coversheet_only": c_only, "output_filename": output_name},
+                              "data": data, "uploads": uploads, "templates": templates},
+                             sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def get_probe_token(conn, proposal_id, proposal_dir, c_only, output_name, rows_token=None):
+    """
+    Compute a cheap token that changes whenever a proposal's inputs might have changed. Unlike
+    `get_proposal_fingerprint` it doesn't read any table data: the database side is a single query (see PROBE_QUERY)
+    and the rest comes from the size and modification time of the files in the proposal's pdf_uploads directory, the
+    Word templates, the renderer version and the command line options.
+    :param conn: This is an open psycopg2 connection.
+    :param proposal_id: This str is the id of the proposal.
+    :param proposal_dir: This str is the path to the proposal's directory.
+    :param c_only: This bool tells the controller to produce only the coversheet.
+    :param output_name: This optional str is the filename of the output PDF.
+    :param rows_token: This is the str result of PROBE_QUERY if it has already been fetched (see
+    `prefetch_proposal_data`).
+    :return: A str sha256 hex digest.
+    """
+    if rows_token is None:
+        with conn.cursor() as cur:
+            db_execute_prepared(cur, "pdf_gen_probe", PROBE_QUERY, {"id": proposal_id})
+            rows_token = cur.fetchone()[0]
+
+    uploads = {}
+    uploads_dir = join(proposal_dir, "pdf_uploads")
+    if os.path.isdir(uploads_dir):
+        with os.scandir(uploads_dir) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("TEMP"):  # Skip repaired copies of uploads.
+                    stat = entry.stat()
+                    uploads[entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+    pdf_gen_dir = config("PDF_GEN_DIR")
+    templates = {os.path.basename(path): docx_template_digest(path)
+                 for path in sorted(glob.glob(join(pdf_gen_dir, "iodp_proposal_pdf_*.docx")))}
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"renderer_version": RENDERER_VERSION,
+                              "options": {"coversheet_only": c_only, "output_filename": output_name},
+                              "rows": rows_token, "uploads": uploads, "templates": templates},
+                             sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def read_generation_marker(output_path):
+    """
+    Read the fingerprint and probe token recorded for an output PDF.
+    :param output_path: This str is the path to the output PDF.
+    :return: A dict with the keys `fingerprint` and `probe`. The dict is empty if the PDF or its marker doesn't exist.
+    """
+    if not os.path.exists(output_path):
+        return {}
+    try:
+        with open(output_path + FINGERPRINT_SUFFIX) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_generation_marker(output_path, fingerprint, probe):
+    """
+    Record the fingerprint and probe token of an output PDF. Passing None for the fingerprint removes the marker.
+    :param output_path: This str is the path to the output PDF.
+    :param fingerprint: This str is the fingerprint (see `get_proposal_fingerprint`) or None.
+    :param probe: This str is the probe token (see `get_probe_token`).
+    :return: None
+    """
+    if fingerprint is None:
+        if os.path.exists(output_path + FINGERPRINT_SUFFIX):
+            os.remove(output_path + FINGERPRINT_SUFFIX)
+        return
+    with open(output_path + FINGERPRINT_SUFFIX + ".tmp", "w") as f:
+        json.dump({"fingerprint": fingerprint, "probe": probe}, f)
+    os.replace(output_path + FINGERPRINT_SUFFIX + ".tmp", output_path + FINGERPRINT_SUFFIX)
+
+
+def generate_proposal_pdf(conn, proposal_id, c_only=False, output_name=None, force=False, prefetched=None):
+    """
+    Generate the PDF for a proposal (see `_generate_proposal_pdf`). If the same proposal is already being generated
+    with the same options in this process then wait for that generation and return its result instead. If it's being
+    generated by another process then wait for that process to finish first. In that case the other process's output
+    is usually up to date by then, so it's reused rather than regenerated.
+    :param conn: This is an open psycopg2 connection used to determine the proposal type. The controller reuses it.
+    :param proposal_id: This str is the id of the proposal to generate.
+    :param c_only: This bool tells the controller to produce only the coversheet.
+    :param output_name: This optional str is the filename of the output PDF.
+    :param force: This bool tells the program to regenerate the PDF even if it's up to date.
+    :param prefetched: This is the proposal's optional entry of the result of `prefetch_proposal_data`.
+    :return: True if the PDF was generated (or was already up to date) and False otherwise.
+    """
+    key = (proposal_id, bool(c_only), output_name, bool(force))
+    with _IN_FLIGHT_LOCK:
+        in_flight = _IN_FLIGHT.get(key)
+        if in_flight is None:
+            in_flight = _IN_FLIGHT[key] = Future()
+            leader = True
+        else:
+            leader = False
+
+    if not leader:
+        print("Proposal %s is already being generated. Waiting for that generation to finish." % proposal_id)
+        return in_flight.result()
+
+    try:
+        proposal_dir = validate_path(join(validate_path(config("PROPOSALS_BASE_DIR")), proposal_id))
+        with generation_lock(proposal_dir, proposal_id):
+            result = _generate_proposal_pdf(conn, proposal_id, c_only, output_name, force, prefetched)
+        in_flight.set_result(result)
+        return result
+    except BaseException as e:
+        in_flight.set_exception(e)
+        raise
+    finally:
+        with _IN_FLIGHT_LOCK:
+            del _IN_FLIGHT[key]
+
+
+@contextmanager
+def generation_lock(proposal_dir, proposal_id):
+    """
+    Hold a proposal's generation lock (see GENERATION_LOCK_NAME), waiting for as long as another run holds it.
+    :param proposal_dir: This str is the path to the proposal's directory.
+    :param proposal_id: This str is the id of the proposal.
+    """
+    # Every run opens the file itself. flock locks belong to the open file so runs on different threads of the same
+    # process exclude each other as well.
+    with open(join(proposal_dir, GENERATION_LOCK_NAME), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("Proposal %s is being generated by another process. Waiting for it to finish." % proposal_id)
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _generate_proposal_pdf(conn, proposal_id, c_only=False, output_name=None, force=False, prefetched=None):
+    """
+    Generate the PDF for a proposal in this process by calling the controller that matches the proposal's type. All
+    output of the controller is written to the proposal's log file (see `get_pdf_log_path`) and an exception raised by
+    the controller is logged there rather than propagated. If the inputs of the proposal haven't changed since the
+    existing output PDF was generated then that PDF is kept and the controller isn't run at all. This is checked with
+    the cheap probe token first (see `get_probe_token`) and then with the full fingerprint (see
+    `get_proposal_fingerprint`). The log is only replaced if the PDF is generated (or generation fails). Otherwise a
+    note that the PDF was up to date is appended to it.
+    :param conn: This is an open psycopg2 connection used to determine the proposal type. The controller reuses it.
+    :param proposal_id: This str is the id of the proposal to generate.
+    :param c_only: This bool tells the controller to produce only the coversheet.
+    :param output_name: This optional str is the filename of the output PDF.
+    :param force: This bool tells the program to regenerate the PDF even if it's up to date.
+    :param prefetched: This is the proposal's optional entry of the result of `prefetch_proposal_data`. If it's
+    specified then no table data (and no probe) is queried.
+    :return: True if the PDF was generated (or was already up to date) and False otherwise.
+    """
+    proposal_dir = validate_path(join(validate_path(config("PROPOSALS_BASE_DIR")), proposal_id))
+    output_path = join(proposal_dir, output_name if output_name else proposal_id + ".pdf")
+
+    log_path = get_pdf_log_path(proposal_id)
+    # The output is kept in memory until it's known whether the PDF is regenerated. Only then is the log replaced, so
+    # that a request for an up to date PDF doesn't wipe out the log of the generation that made it.
+    output = io.StringIO()
+    obj = None
+    try:
+        with redirect_output_to_stream(output):
+            try:
+                # The probe only needs one small query so an unchanged proposal is served without reading any table
+                # data.
+                probe = get_probe_token(conn, proposal_id, proposal_dir, c_only, output_name,
+                                        prefetched["probe"] if prefetched else None)
+                marker = read_generation_marker(output_path)
+                up_to_date = not force and marker.get("probe") == probe
+
+                if not up_to_date:
+                    if prefetched:
+                        # The proposal row is among the prefetched rows so the generator is created up front to read
+                        # it from them.
+                        obj = WordProposalGenerator(proposal_id, conn, prefetched_rows=prefetched["rows"])
+                        proposal_row, proposal_cols = obj.data.proposal.row, obj.data.proposal.cols
+                    else:
+                        proposal_row, proposal_cols = get_proposal_row(conn, proposal_id)
+                    if not proposal_row:
+                        raise RuntimeError("This proposal does not yet exist in the database.")
+
+                    proposal_type = proposal_row[proposal_cols.index("proposal_type")]
+                    controller, generate = get_controller(proposal_type)
+
+                    # Hand over the connection and the proposal row so that the generator doesn't reconnect or
+                    # re-query.
+                    if obj is None:
+                        obj = WordProposalGenerator(proposal_id, conn, proposal_row, proposal_cols)
+
+                    # The probe can change without the data the PDF is made from changing (e.g. a row was saved with
+                    # the same values) so check the full fingerprint before doing any work.
+                    fingerprint = get_proposal_fingerprint(obj, controller, proposal_type, c_only, output_name)
+                    if not force and marker.get("fingerprint") == fingerprint:
+                        write_generation_marker(output_path, fingerprint, probe)
+                        up_to_date = True
+            except Exception:
+                traceback.print_exc()
+                with open(log_path, "w") as log:
+                    log.write(output.getvalue())
+                return False
+
+        if up_to_date:
+            with redirect_output_to_log(log_path, "a") as log:
+                log.write(output.getvalue())
+                print("-PDF IS UP TO DATE-")
+                print("Nothing has changed since " + output_path + " was generated so it was kept.")
+            return True
+
+        with redirect_output_to_log(log_path) as log:
+            log.write(output.getvalue())
+            try:
+                # Forget the old marker until the new PDF is complete in case generation fails part way through.
+                write_generation_marker(output_path, None, None)
+                # The generator has already read every table the controller needs so it's handed over as well.
+                generate(proposal_id, c_only, output_name, conn, proposal_row, proposal_cols, obj)
+                write_generation_marker(output_path, fingerprint, probe)
+            except Exception:
+                traceback.print_exc()
+                return False
+        return True
+    finally:
+        # The generator was handed to the controller so the controller left it open.
+        if obj is not None:
+            obj.close()
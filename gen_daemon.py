@@ -0,0 +1,160 @@
+from decouple import config
+import json
+import os
+import re
+import socket
+import socketserver
+import threading
+import time
+
+# Note: this module is imported by the gen.py client so it must stay cheap to import. Everything heavy (python-docx,
+# pypdf, psycopg2, the controllers) is imported by the server only.
+
+# The Unix socket that the generation daemon listens on and that gen.py connects to.
+DAEMON_SOCKET_PATH = config("PDF_GEN_DAEMON_SOCKET", default="/tmp/pdf_generator.sock")
+
+# The permissions of the daemon's socket. Only users that can connect to it can request generations, so it's restricted
+# to the daemon's user and group (the web server's user should be in that group).
+DAEMON_SOCKET_MODE = config("PDF_GEN_DAEMON_SOCKET_MODE", default="660", cast=lambda mode: int(mode, 8))
+
+# Run the change listener (see gen_listener.py) inside the daemon. Downloads of a proposal that is being pre-generated
+# then share that generation instead of waiting for its lock.
+DAEMON_LISTEN = config("PDF_GEN_DAEMON_LISTEN", default=False, cast=bool)
+
+
+def validate_request(proposal_id, output_name):
+    """
+    Check the parts of a generation request that paths are built from so that a client can't make the daemon write
+    (or delete) files outside the proposal's directory.
+    :param proposal_id: This str is the id of the proposal. It must be an integer.
+    :param output_name: This optional str is the filename of the output PDF. It must be a bare filename.
+    :return: None
+    """
+    if not re.fullmatch(r"[0-9]+", proposal_id):
+        raise ValueError("The proposal id must be an integer.")
+    if output_name is not None and (not isinstance(output_name, str) or output_name in ("", ".", "..") or
+                                    os.path.basename(output_name) != output_name or "\0" in output_name):
+        raise ValueError("The output filename must be a filename without a directory.")
+
+
+def remove_stale_socket(socket_path):
+    """
+    Remove the socket left behind by a previous daemon that didn't shut down cleanly.
+    :param socket_path: This str is the path of the Unix socket.
+    :return: None
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)  # Nothing is listening on it anymore.
+            return
+    raise RuntimeError("Another daemon is already listening on " + socket_path)
+
+
+class GenerationRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle a single generation request. A request is one line of JSON with the keys `proposal_id`, `coversheet_only`,
+    `output_filename` and `force` (mirroring the gen.py command line arguments). The response is one line of JSON with the keys
+    `returncode` (0 on success, 1 on failure), `seconds`, `log_file` and, on failure, `error`.
+    """
+    def handle(self):
+        tic = time.perf_counter()
+        line = self.rfile.readline()
+        if not line:
+            return  # The client hung up without a request (e.g. `remove_stale_socket` checking that we're alive).
+        try:
+            request = json.loads(line)
+            proposal_id = str(request["proposal_id"])
+            validate_request(proposal_id, request.get("output_filename"))
+            success = self.server.generate(proposal_id, bool(request.get("coversheet_only")),
+                                           request.get("output_filename"), bool(request.get("force")))
+            response = {"returncode": 0 if success else 1,
+                        "log_file": self.server.dispatch.get_pdf_log_path(proposal_id)}
+        except Exception as e:
+            response = {"returncode": 1, "error": str(e)}
+        response["seconds"] = time.perf_counter() - tic
+        self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class GenerationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-running PDF generation service. python-docx, docxcompose, pypdf, the Word templates and the database
+    connection are all loaded once when the server starts rather than once per download.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        # Import the controllers now so that the first request doesn't pay for loading them.
+        from pdf_gen_helper_functions import db_connection, docx_preload_templates, validate_path
+        from proposal_data import LOOKUP_CACHE
+        import controller_dispatch
+        self.dispatch = controller_dispatch
+        # Every request borrows its own connection from the pool so that concurrent requests don't share one. The
+        # connections stay open between requests.
+        self.db_connection = db_connection
+
+        print("Loaded %d Word templates" % docx_preload_templates(validate_path(config("PDF_GEN_DIR"))))
+        # Proponents and users recur across the proposals that the daemon generates so their rows are cached.
+        LOOKUP_CACHE.enable()
+
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, GenerationRequestHandler)
+
+        # Started once the socket is bound since binding briefly changes the umask of the whole process.
+        if DAEMON_LISTEN:
+            import gen_listener
+            threading.Thread(target=gen_listener.listen, name="gen_listener", daemon=True).start()
+
+    def server_bind(self):
+        # Create the socket with DAEMON_SOCKET_MODE straight away (rather than chmod it afterwards) so that there's no
+        # moment when anyone can connect.
+        umask = os.umask(0o777 & ~DAEMON_SOCKET_MODE)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def generate(self, proposal_id, c_only, output_name, force=False):
+        print("Generating proposal %s" % proposal_id)
+        with self.db_connection() as conn:
+            return self.dispatch.generate_proposal_pdf(conn, proposal_id, c_only, output_name, force)
+
+
+def serve(socket_path=DAEMON_SOCKET_PATH):
+    """
+    Run the generation daemon until it is interrupted.
+    :param socket_path: This str is the path of the Unix socket to listen on.
+    :return: None
+    """
+    with GenerationServer(socket_path) as server:
+        print("Listening for generation requests on " + socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def request_generation(proposal_id, c_only=False, output_name=None, force=False, socket_path=DAEMON_SOCKET_PATH):
+    """
+    Ask the generation daemon to generate a proposal PDF and wait for it to finish.
+    :param proposal_id: This str is the id of the proposal to generate.
+    :param c_only: This bool tells the daemon to produce only the coversheet.
+    :param output_name: This optional str is the filename of the output PDF.
+    :param force: This bool tells the daemon to regenerate the PDF even if it's up to date.
+    :param socket_path: This str is the path of the daemon's Unix socket.
+    :return: The response dict sent back by the daemon, or None if no daemon is listening on `socket_path`.
+    """
+    request = {"proposal_id": proposal_id, "coversheet_only": c_only, "output_filename": output_name, "force": force}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        sock.sendall((json.dumps(request) + "\n").encode())
+        with sock.makefile("rb") as response:
+            return json.loads(response.readline())
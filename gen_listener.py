@@ -0,0 +1,218 @@
+from decouple import config
+from pdf_gen_helper_functions import db_connect, db_connection, extensions
+from proposal_data import BULK_TABLES, LOOKUP_CACHE
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import psycopg2
+import select
+import threading
+import time
+import traceback
+
+# The channel that the triggers installed by `install_notify_triggers` notify with the id of every proposal whose rows
+# change.
+NOTIFY_CHANNEL = config("PDF_GEN_NOTIFY_CHANNEL", default="pdf_gen_proposal_changed")
+
+# A proposal is pre-generated once no change to it has been notified for this many seconds, so that a user saving the
+# web forms field by field only causes one generation.
+PREGEN_QUIET_SECONDS = config("PDF_GEN_PREGEN_QUIET_SECONDS", default=30, cast=float)
+
+# A proposal that keeps changing is still pre-generated this many seconds after the first change that's pending.
+PREGEN_MAX_DELAY_SECONDS = config("PDF_GEN_PREGEN_MAX_DELAY_SECONDS", default=300, cast=float)
+
+# The number of proposals pre-generated at once.
+PREGEN_JOBS = config("PDF_GEN_PREGEN_JOBS", default=2, cast=int)
+
+# Every table that the generator reads. A change to any of their rows notifies NOTIFY_CHANNEL.
+NOTIFY_TABLES = BULK_TABLES + ["pdf_uploads"]
+
+# The trigger function that maps a changed row to the ids of the proposals it belongs to and notifies the channel given
+# as the trigger's argument with each of them. Both the old and the new version of an updated row are mapped so that a
+# row moved to another proposal (or site) notifies both. Postgres only delivers identical notifications once per
+# transaction so a form saved in one transaction notifies each proposal once.
+NOTIFY_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION pdf_gen_notify_proposal_changed() RETURNS trigger AS $$
+DECLARE
+    changed_rows json[] := '{}';
+    changed json;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        changed_rows := changed_rows || row_to_json(OLD);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed_rows := changed_rows || row_to_json(NEW);
+    END IF;
+    FOREACH changed IN ARRAY changed_rows LOOP
+        PERFORM pg_notify(TG_ARGV[0], ids.proposal_id) FROM (
+            SELECT changed->>'id' AS proposal_id WHERE TG_TABLE_NAME = 'proposal'
+            UNION SELECT changed->>'proposal_id' WHERE TG_TABLE_NAME IN
+                ('coversheet', 'coversheet_proponent_map', 'site', 'srr_checklist', 'pdf_uploads')
+            UNION SELECT s.proposal_id::text FROM site s WHERE TG_TABLE_NAME IN
+                ('site_operational_info', 'site_measurements', 'site_lithos', 'site_dataset_info',
+                 'site_pollution_safety_hazards') AND s.id::text = changed->>'site_id'
+            UNION SELECT m.proposal_id::text FROM coversheet_proponent_map m
+                WHERE TG_TABLE_NAME = 'proponent' AND m.proponent_id::text = changed->>'id'
+            UNION SELECT p.id::text FROM proposal p
+                WHERE TG_TABLE_NAME = 'sso_users' AND p.user_id::text = changed->>'username'
+        ) ids WHERE ids.proposal_id IS NOT NULL;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+
+def install_notify_triggers(conn, channel=NOTIFY_CHANNEL):
+    """
+    Install (or replace) the trigger on every table in NOTIFY_TABLES that notifies `channel` when a row changes. This
+    has to be run once per database by a user that may create functions and triggers.
+    :param conn: This is an open psycopg2 connection.
+    :param channel: This str is the notification channel.
+    :return: None
+    """
+    with conn.cursor() as cur:
+        cur.execute(NOTIFY_FUNCTION_SQL)
+        for table in NOTIFY_TABLES:
+            cur.execute("DROP TRIGGER IF EXISTS pdf_gen_notify ON " + table)
+            cur.execute("CREATE TRIGGER pdf_gen_notify AFTER INSERT OR UPDATE OR DELETE ON " + table +
+                        " FOR EACH ROW EXECUTE PROCEDURE pdf_gen_notify_proposal_changed(%s)", (channel,))
+    conn.commit()
+
+
+class DebounceQueue:
+    """
+    The proposals waiting to be pre-generated. A proposal is due once no change to it has been added for
+    `quiet_seconds`, or `max_delay_seconds` after the first change that was added, whichever comes first. Times are
+    time.monotonic() values.
+    """
+    def __init__(self, quiet_seconds, max_delay_seconds):
+        self.quiet_seconds = quiet_seconds
+        self.max_delay_seconds = max_delay_seconds
+        # Every pending proposal id mapped to a 2-tuple of the times of its first and its last pending change.
+        self.pending = {}
+
+    def add(self, proposal_id, now):
+        first = self.pending.get(proposal_id, (now, now))[0]
+        self.pending[proposal_id] = (first, now)
+
+    def due_time(self, proposal_id):
+        first, last = self.pending[proposal_id]
+        return min(last + self.quiet_seconds, first + self.max_delay_seconds)
+
+    def pop_due(self, now, skip=()):
+        """
+        Remove the proposals that are due.
+        :param now: This float is the current time.
+        :param skip: This is a collection of proposal ids that are left pending even if they're due.
+        :return: A list of the str ids of the due proposals.
+        """
+        due = [proposal_id for proposal_id in self.pending
+               if proposal_id not in skip and self.due_time(proposal_id) <= now]
+        for proposal_id in due:
+            del self.pending[proposal_id]
+        return due
+
+    def seconds_until_due(self, now):
+        """
+        :return: The float number of seconds until the next proposal is due (0 if one is already due), or None if no
+        proposal is pending.
+        """
+        if not self.pending:
+            return None
+        return max(min(self.due_time(proposal_id) for proposal_id in self.pending) - now, 0)
+
+
+def pregenerate(proposal_id):
+    """
+    Generate a proposal's PDF in the background. The generation is skipped if the PDF is already up to date (see
+    controller_dispatch). Output goes to the proposal's log file as usual.
+    :param proposal_id: This str is the id of the proposal.
+    :return: True if the PDF was generated (or was already up to date) and False otherwise.
+    """
+    from controller_dispatch import generate_proposal_pdf
+    with db_connection() as conn:
+        return generate_proposal_pdf(conn, proposal_id)
+
+
+def listen(channel=NOTIFY_CHANNEL, quiet_seconds=PREGEN_QUIET_SECONDS, max_delay_seconds=PREGEN_MAX_DELAY_SECONDS,
+           jobs=PREGEN_JOBS):
+    """
+    Pre-generate proposals as they change. This listens on `channel` (see `install_notify_triggers`) and regenerates
+    every notified proposal on a pool of `jobs` threads once its changes have settled (see DebounceQueue). A proposal
+    that changes again while it's being generated is generated once more afterwards. If the connection is lost then it's
+    reopened. Changes notified while it was down are missed until the proposal changes again or is downloaded.
+    This runs until it's interrupted.
+    :param channel: This str is the notification channel.
+    :param quiet_seconds: This float is the `quiet_seconds` of the DebounceQueue.
+    :param max_delay_seconds: This float is the `max_delay_seconds` of the DebounceQueue.
+    :param jobs: This int is the number of proposals generated at once.
+    :return: None
+    """
+    queue = DebounceQueue(quiet_seconds, max_delay_seconds)
+    LOOKUP_CACHE.enable()
+    running = set()
+    running_lock = threading.Lock()
+
+    def run(proposal_id):
+        tic = time.perf_counter()
+        try:
+            success = pregenerate(proposal_id)
+            print("Pre-generated proposal %s (%s) in %0.1f seconds"
+                  % (proposal_id, "success" if success else "failed", time.perf_counter() - tic))
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with running_lock:
+                running.discard(proposal_id)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while True:
+            conn = None
+            try:
+                conn = db_connect()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute("LISTEN " + extensions.quote_ident(channel, conn))
+                print("Listening for changes on " + channel)
+
+                while True:
+                    # Wake up when the next proposal is due, or now and then to start proposals that were held back
+                    # because they were running.
+                    timeout = queue.seconds_until_due(time.monotonic())
+                    timeout = 5 if timeout is None else min(timeout, 5)
+                    if select.select([conn], [], [], timeout)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            queue.add(conn.notifies.pop(0).payload, time.monotonic())
+
+                    with running_lock:
+                        due = queue.pop_due(time.monotonic(), skip=running)
+                        running.update(due)
+                    for proposal_id in due:
+                        pool.submit(run, proposal_id)
+
+            except psycopg2.OperationalError:
+                traceback.print_exc()
+                print("Lost the connection to the database. Reconnecting in 5 seconds.")
+                if conn is not None:
+                    conn.close()
+                time.sleep(5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate proposal PDFs in the background as proposals change.")
+    parser.add_argument("--install-triggers", action="store_true", help="Install the triggers that notify the listener of changes and exit.")
+    parser.add_argument("--quiet-seconds", type=float, default=PREGEN_QUIET_SECONDS, help="Wait until a proposal hasn't changed for this many seconds before generating it.")
+    parser.add_argument("--max-delay-seconds", type=float, default=PREGEN_MAX_DELAY_SECONDS, help="Generate a proposal that keeps changing at most this many seconds after its first pending change.")
+    parser.add_argument("--jobs", type=int, default=PREGEN_JOBS, help="The number of proposals to generate at once.")
+    args = parser.parse_args()
+
+    if args.install_triggers:
+        conn = db_connect()
+        install_notify_triggers(conn)
+        conn.close()
+        print("Installed the %s triggers on %s" % (NOTIFY_CHANNEL, ", ".join(NOTIFY_TABLES)))
+    else:
+        try:
+            listen(quiet_seconds=args.quiet_seconds, max_delay_seconds=args.max_delay_seconds, jobs=args.jobs)
+        except KeyboardInterrupt:
+            pass
@@ -1,9 +1,24 @@
 from decouple import config
 import subprocess
+import contextvars
 import docx
+import glob
+import hashlib
 import re
 import os
+import sys
+import threading
+import time
+import weakref
+from io import BytesIO
+import datetime as _datetime  # Aliased so that `from pdf_gen_helper_functions import *` doesn't export it.
+from decimal import Decimal
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager
 from os.path import join
+from psycopg2 import connect, extensions
+from psycopg2.pool import ThreadedConnectionPool
 from docx.shared import Pt
 from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.table import WD_ALIGN_VERTICAL
@@ -13,9 +28,10 @@ from docx.oxml.text.paragraph import CT_P
 from docx.table import _Cell, Table
 from docx.text.paragraph import Paragraph
 from docx.oxml.shared import OxmlElement
-from docx.oxml.ns import nsdecls
+from docx.oxml.ns import nsdecls, qn
 from docx.oxml import parse_xml
-from pypdf import PdfReader, PdfWriter
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
 
 
 def docx_format_string(string):
@@ -158,6 +174,33 @@ def docx_format_seismic_reflection_data(location, position, position_type, descr
     return return_me
 
 
+# The unoserver instance ("host:port") that this process sends Word documents to for conversion. None means the
+# unoserver client default (127.0.0.1:2003). Batch workers each set their own endpoint so that conversions from
+# different workers don't queue up behind a single soffice process.
+_CONVERSION_ENDPOINT = None
+
+
+def get_conversion_endpoints():
+    """
+    Read the list of available unoserver instances from the UNOSERVER_ENDPOINTS value in the .env file. The value is a
+    comma separated list of "host:port" strs, e.g. "127.0.0.1:2003,127.0.0.1:2005".
+    :return: A list of "host:port" strs. The list is empty if no endpoints are configured.
+    """
+    return [endpoint.strip() for endpoint in config("UNOSERVER_ENDPOINTS", default="").split(",") if endpoint.strip()]
+
+
+def set_conversion_endpoint(endpoint):
+    """
+    Pin all future Word to PDF conversions made by this process to a specific unoserver instance.
+    :param endpoint: This is a "host:port" str or None to go back to the unoserver default.
+    :return: None
+    """
+    global _CONVERSION_ENDPOINT
+    if endpoint is not None and (not isinstance(endpoint, str) or ":" not in endpoint):
+        raise ValueError("The `endpoint` argument must be a str of the form \"host:port\" or None.")
+    _CONVERSION_ENDPOINT = endpoint
+
+
 def docx_convert_word_to_pdf(input_path, output_path):
     """
     Run the PDF converter tool on the input word document and write a converted PDF file to the out_path arg.
@@ -174,11 +217,14 @@ def docx_convert_word_to_pdf(input_path, output_path):
         input_path,
         output_path
     ]
+    if _CONVERSION_ENDPOINT:
+        host, port = _CONVERSION_ENDPOINT.rsplit(":", 1)
+        cmd += ["--host", host, "--port", port]
 
     # Run the command as a shell script.
     print("Running the following command to convert completed webform templates to PDF:")
     print(" ".join(cmd))
-    subprocess.run(cmd)
+    run_logged_subprocess(cmd)
 
 
 def docx_delete_paragraph(paragraph):
@@ -395,6 +441,10 @@ def docx_build_table(doc_obj, table_id, table_data, background_color="#FFFFFF"):
             new_row[i]._tc.get_or_add_tcPr().append(shading_elm)
 
 
+# A template tag, e.g. {{coversheet.title}}. The first group is the tag's name.
+DOCX_TAG_PATTERN = re.compile(r"\{\{([^{}]*)\}\}")
+
+
 def docx_search_and_replace_tags(doc_obj, search_data, external_i=None, crash_on_except=False):
     """
     Search the specified document for tags and replace these tags with a corresponding value. The tags and values
@@ -409,15 +459,19 @@ def docx_search_and_replace_tags(doc_obj, search_data, external_i=None, crash_on
     retrieve a specific string. If there are multiple values that are list-types then the same external_i value will be
     used to index into each of them. This function should be called once per document-template-tag-dict pair. The
     recursion in this function is used to search through paragraphs nested inside of table cells, headers, and footer
-    elements.
+    elements. Only the values of the tags that occur in the document are looked up, so `search_data` can be a LazyTags
+    that only computes those.
     :param doc_obj: This is the Document object to search and replace tags through.
-    :param search_data: This is a dictionary of template tag values paired with either strings or a list of strings.
+    :param search_data: This is a dict (or other Mapping) of template tag values paired with either strings or a list of
+    strings.
     :param external_i: This is an int used to index into the list of strings.
     :return: None
     """
     def sub_cb(match):
-        match_parsed = re.sub(r"\{\{|\}\}", "", match.group())
-        val = search_data.get(match_parsed, None)
+        match_parsed = match.group(1)
+        if match_parsed not in search_data:
+            return match.group()    # Leave tags that aren't in `search_data` as they are.
+        val = search_data[match_parsed]
         val_bindings = {}
         if isinstance(val, tuple):
             temp = val[1]
@@ -445,14 +499,13 @@ def docx_search_and_replace_tags(doc_obj, search_data, external_i=None, crash_on
     # Verify argument types.
     if not isinstance(doc_obj, (docx.document.Document, docx.section._Header, docx.section._Footer, docx.table._Cell)):
         raise ValueError("The doc_obj argument must be a Document.")
-    if not isinstance(search_data, dict):
+    if not isinstance(search_data, Mapping):
         raise ValueError("The search_data argument must be a dictionary.")
     if not isinstance(external_i, (type(None), int)):
         raise ValueError("The external_i argument must be an int.")
 
     # Search all text in the document for regex matches except for header content and tables
-    tags = re.compile(
-        "|".join(map(re.escape, ["{{" + key + "}}" for key in search_data])))  # Define set of re patterns to match on
+    tags = DOCX_TAG_PATTERN
     for p in doc_obj.paragraphs:
         run_sum = ""
         for i in range(len(p.runs)):
@@ -731,15 +784,19 @@ def instantiate_pdf_reader(pdf_dir, pdf_name, label=None):
     except Exception:
         print("""ERROR: The input pdf is malformed.""")
         print("Attempting to repair the PDF...")
-        proc = subprocess.run(["gs",
-                               "-o",
-                               join(pdf_dir, "TEMP_" + pdf_name),
-                               "-sDEVICE=pdfwrite",
-                               "-dPDFSETTINGS=/prepress",
-                               join(pdf_dir, pdf_name)
-                               ])
+        try:
+            proc = run_logged_subprocess(["gs",
+                                   "-o",
+                                   join(pdf_dir, "TEMP_" + pdf_name),
+                                   "-sDEVICE=pdfwrite",
+                                   "-dPDFSETTINGS=/prepress",
+                                   join(pdf_dir, pdf_name)
+                                   ])
+        except subprocess.TimeoutExpired:
+            proc = None
+            print("\nThe repair took too long and was stopped.")
         # If the PDF repair attempt is successful then retry appending the page.
-        if proc.returncode == 0:
+        if proc is not None and proc.returncode == 0:
             print("\nAttempt to repair: Successful")
             reader = PdfReader(join(pdf_dir, "TEMP_" + pdf_name))
         else:
@@ -747,4 +804,509 @@ def instantiate_pdf_reader(pdf_dir, pdf_name, label=None):
             print("Treating file " + pdf_name + " as missing.")
             return None     # If the file cannot be repaired then treat it as if it was missing.
 
-    return reader
\ No newline at end of file
+    return reader
+
+# Raw bytes of every Word template that has been read so far keyed by absolute path. Each value is a 3-tuple of the
+# file's modification time, its contents and a hash of its contents so that an edited template is picked up without
+# restarting the process.
+_TEMPLATE_CACHE = {}
+
+
+def docx_load_template(template_path):
+    """
+    Create a Document object from a Word template. The template's bytes are kept in memory after the first read so that
+    long-running processes (like the generation daemon) don't go back to disk for every proposal. The cache entry is
+    refreshed whenever the template file's modification time changes.
+    :param template_path: This str is an absolute path to the Word template.
+    :return: A new Document object that can be freely modified without affecting the cached template.
+    """
+    return docx.Document(BytesIO(_read_template(template_path)[1]))
+
+
+def _read_template(template_path):
+    """
+    Get the template cache entry for a Word template, reading the file if it isn't cached yet or if it has changed.
+    :param template_path: This str is an absolute path to the Word template.
+    :return: A 3-tuple of the file's modification time, its contents and the sha256 hex digest of its contents.
+    """
+    mtime = os.path.getmtime(template_path)
+    cached = _TEMPLATE_CACHE.get(template_path)
+    if cached is None or cached[0] != mtime:
+        with open(template_path, "rb") as template_file:
+            contents = template_file.read()
+        cached = (mtime, contents, hashlib.sha256(contents).hexdigest())
+        _TEMPLATE_CACHE[template_path] = cached
+    return cached
+
+
+def docx_template_digest(template_path):
+    """
+    Get a hash of a Word template's contents. The hash changes whenever the template is edited.
+    :param template_path: This str is an absolute path to the Word template.
+    :return: A str sha256 hex digest.
+    """
+    return _read_template(template_path)[2]
+
+
+# The tags of every Word template that has been inventoried so far keyed by the sha256 hex digest of its contents.
+_TEMPLATE_TAGS = {}
+
+
+def docx_get_template_tags(template_path):
+    """
+    Get the inventory of the tags that occur in a Word template, i.e. every tag that `docx_search_and_replace_tags` could
+    replace in it. Tags are found in the text of every paragraph (as joined from its runs) of the body, the tables, the
+    headers and the footers. The inventory is only taken once per version of the template.
+    :param template_path: This str is an absolute path to the Word template.
+    :return: A frozenset of the str names of the tags.
+    """
+    digest = docx_template_digest(template_path)
+    tags = _TEMPLATE_TAGS.get(digest)
+    if tags is None:
+        found = set()
+        for part in docx_load_template(template_path).part.package.iter_parts():
+            element = getattr(part, "element", None)    # Only XML parts have one.
+            if element is None:
+                continue
+            for paragraph in element.iter(qn("w:p")):
+                found.update(DOCX_TAG_PATTERN.findall("".join(text.text or "" for text in paragraph.iter(qn("w:t")))))
+        tags = _TEMPLATE_TAGS.setdefault(digest, frozenset(found))
+    return tags
+
+
+def docx_preload_templates(template_dir):
+    """
+    Read every Word template in a directory into the template cache used by `docx_load_template`.
+    :param template_dir: This str is the path to the directory containing the Word templates.
+    :return: An int equal to the number of templates that were loaded.
+    """
+    template_paths = glob.glob(join(template_dir, "iodp_proposal_pdf_*.docx"))
+    for template_path in template_paths:
+        docx_load_template(template_path)
+    return len(template_paths)
+
+
+def get_db_settings():
+    """
+    Get the connection settings of the database specified by the DB_* values in the .env file.
+    :return: A dict of keyword arguments for psycopg2's connect.
+    """
+    return {
+        "host": config("DB_HOST"),
+        "database": config("DB_DATABASE"),
+        "user": config("DB_USERNAME"),
+        "password": config("DB_PASSWORD"),
+        "port": config("DB_PORT"),
+    }
+
+
+def db_connect():
+    """
+    Open a new connection to the database specified by the DB_* values in the .env file.
+    :return: A psycopg2 connection object.
+    """
+    return connect(**get_db_settings())  # This variable links the iodpdatadev database to this program
+
+
+# The most connections that the pool of a single process (e.g. the daemon or a gen_script.py worker) opens at once.
+DB_POOL_MAX_CONNECTIONS = config("DB_POOL_MAX_CONNECTIONS", default=4, cast=int)
+
+# The pool is created on first use so that importing this module doesn't connect. The semaphore makes callers wait for
+# a free connection rather than fail when all DB_POOL_MAX_CONNECTIONS are in use.
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+_DB_POOL_SLOTS = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a connection from this process's connection pool for the duration of a `with` block. The connection is put
+    back (and stays open for the next caller) when the block exits, so a process that generates many proposals only
+    connects once. Pooled connections are in autocommit mode since every query the generator runs is a read.
+    :return: A context manager that yields an open psycopg2 connection.
+    """
+    global _DB_POOL
+    with _DB_POOL_SLOTS:
+        with _DB_POOL_LOCK:
+            if _DB_POOL is None:
+                _DB_POOL = ThreadedConnectionPool(0, DB_POOL_MAX_CONNECTIONS, **get_db_settings())
+            pool = _DB_POOL
+        conn = pool.getconn()
+        if conn.closed:     # Dropped while it was idle in the pool.
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        try:
+            conn.autocommit = True
+            yield conn
+        finally:
+            # A connection that was interrupted in the middle of a query (e.g. by a timeout) isn't reused.
+            pool.putconn(conn, close=bool(conn.closed) or
+                         conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE)
+
+
+# The names of the statements prepared on each connection (see db_execute_prepared). Entries go away with their
+# connection.
+_PREPARED_STATEMENTS = weakref.WeakKeyDictionary()
+_PREPARED_STATEMENTS_LOCK = threading.Lock()
+
+
+def db_execute_prepared(cur, name, query, params=()):
+    """
+    Run one of the program's fixed queries as a server-side prepared statement. The statement is prepared the first
+    time it's run on a connection and every later run on that connection only sends the parameters, so Postgres parses
+    and plans each query once per connection rather than once per proposal.
+    :param cur: This is the psycopg2 cursor to run the query on.
+    :param name: This str is the name of the prepared statement. Every distinct query must have its own name.
+    :param query: This str is the query with psycopg2 placeholders (either %s or %(name)s, not both).
+    :param params: This is a tuple or dict of parameters just like for cursor.execute.
+    :return: None
+    """
+    keys = []   # The index (for %s) or name (for %(name)s) of the parameter that each $n placeholder stands for.
+
+    def to_placeholder(match):
+        if match.group(0) == "%%":
+            return "%"
+        key = len(keys) if match.group(1) is None else match.group(1)
+        if key not in keys:
+            keys.append(key)
+        return "$%d" % (keys.index(key) + 1)
+
+    statement = re.sub(r"%\((\w+)\)s|%s|%%", to_placeholder, query)
+    with _PREPARED_STATEMENTS_LOCK:
+        prepared = _PREPARED_STATEMENTS.setdefault(cur.connection, set())
+        if name not in prepared:
+            cur.execute("PREPARE %s AS %s" % (name, statement))
+            prepared.add(name)
+    values = [params[key] for key in keys]
+    if values:
+        cur.execute("EXECUTE %s (%s)" % (name, ", ".join(["%s"] * len(values))), values)
+    else:
+        cur.execute("EXECUTE " + name)
+
+
+class LazyTags(Mapping):
+    """
+    A read-only tag dict whose values are computed the first time they're looked up (and kept after that). Filling a
+    template in with it (see `docx_search_and_replace_tags`) only computes the tags that occur in the template. It may
+    be read by several threads at once. A value that two threads look up at the same time may then be computed twice,
+    so computing a value must not have side effects.
+    """
+    def __init__(self, tags, compute):
+        """
+        :param tags: This is an iterable of the str tags in order.
+        :param compute: This is a callable taking a str tag and returning its value.
+        """
+        self.tags = dict.fromkeys(tags)
+        self.compute = compute
+        self.values = {}
+
+    def __getitem__(self, tag):
+        try:
+            return self.values[tag]
+        except KeyError:
+            if tag not in self.tags:
+                raise
+        value = self.values[tag] = self.compute(tag)
+        return value
+
+    def __contains__(self, tag):
+        return tag in self.tags
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __len__(self):
+        return len(self.tags)
+
+
+class Columns(list):
+    """
+    The column names of a query result. It's a list so it can be used wherever a list of column names is expected, but
+    its `index` is a dict lookup rather than a scan of the list. It also turns the rows of the result into compact
+    records (namedtuples) that are indexed like the original tuples and additionally allow access by column name, e.g.
+    `site.name`. Where several columns share a name (joins) the first one is used, just like list.index.
+    """
+    def __init__(self, names):
+        super().__init__(names)
+        self.positions = {}
+        for i, name in enumerate(names):
+            self.positions.setdefault(name, i)
+        self.record_type = _get_record_type(tuple(names))
+
+    def index(self, name, *args):
+        if args:
+            return super().index(name, *args)
+        try:
+            return self.positions[name]
+        except KeyError:
+            raise ValueError("%r is not in list" % (name,)) from None
+
+    def record(self, row):
+        """
+        :param row: This is a row (tuple) of the result or None.
+        :return: The row as a record, or None if `row` is None.
+        """
+        return None if row is None else self.record_type._make(row)
+
+
+# The record types made by Columns, keyed by their tuple of column names, so each distinct result shape only defines
+# its namedtuple class once per process.
+_RECORD_TYPES = {}
+
+
+def _get_record_type(names):
+    record_type = _RECORD_TYPES.get(names)
+    if record_type is None:
+        # rename=True turns repeated (joined) column names into positional names so that the first column keeps its name.
+        record_type = _RECORD_TYPES.setdefault(names, namedtuple("Record", names, rename=True))
+    return record_type
+
+
+def db_decode_json_value(value, type_name):
+    """
+    Convert a column value that Postgres serialized to JSON back to the Python type that psycopg2 would have returned
+    had the column been selected directly. JSON has no date or decimal types so these come back as strings and numbers.
+    :param value: This is the value decoded by json.loads (which must be called with parse_float=Decimal so that
+    numeric columns don't lose precision).
+    :param type_name: This str is the column's type as reported by Postgres' format_type (e.g. "numeric(10,2)").
+    :return: The converted value. Values of types that JSON represents faithfully (text, int, bool, ...) are returned
+    unchanged.
+    """
+    if value is None:
+        return None
+    try:
+        if type_name.startswith("numeric"):
+            return Decimal(value)
+        if type_name in ("real", "double precision"):
+            return float(value)
+        if type_name == "date":
+            return _datetime.date.fromisoformat(value)
+        if type_name.startswith("time"):
+            # Postgres drops trailing zeros from the fraction but fromisoformat only accepts 3 or 6 digits before 3.11.
+            value = re.sub(r"\.(\d+)", lambda m: "." + m.group(1).ljust(6, "0")[:6], value)
+            if type_name.startswith("timestamp"):
+                return _datetime.datetime.fromisoformat(value)
+            return _datetime.time.fromisoformat(value)
+    except ValueError:
+        return value    # e.g. 'infinity' which Python has no date for.
+    return value
+
+
+def db_decode_json_rows(objects, columns):
+    """
+    Convert the output of json_agg over a table back into rows like the ones returned by cursor.fetchall().
+    :param objects: This is the list of dicts (one per row, keyed by column name) produced by json_agg, or None if the
+    aggregate had no rows.
+    :param columns: This is a list of [name, type] pairs for every column of the table in table order.
+    :return: A list of tuples with one element per column in `columns`.
+    """
+    return [tuple(db_decode_json_value(obj.get(name), type_name) for name, type_name in columns)
+            for obj in objects or []]
+
+
+# The log file that output of the current generation should be written to. A context variable (rather than a plain
+# global) is used so that concurrent generations inside the same process (i.e. the daemon) each write to their own log.
+_LOG_STREAM = contextvars.ContextVar("log_stream", default=None)
+
+
+class _ContextAwareStream:
+    """
+    Stand-in for sys.stdout/sys.stderr that forwards writes to the log file of the current context (see
+    `redirect_output_to_log`) or to the original stream when no log file is active.
+    """
+    def __init__(self, default_stream):
+        self.default_stream = default_stream
+
+    def _target(self):
+        return _LOG_STREAM.get() or self.default_stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+@contextmanager
+def redirect_output_to_stream(stream):
+    """
+    Send everything printed in the current context to `stream` for the duration of the with-block (see
+    `redirect_output_to_log`).
+    :param stream: This is a writable text stream, e.g. an io.StringIO. If it isn't a real file then no subprocess may
+    be started through `run_logged_subprocess` in the with-block.
+    :yield: The stream.
+    """
+    if not isinstance(sys.stdout, _ContextAwareStream):
+        sys.stdout = _ContextAwareStream(sys.stdout)
+    if not isinstance(sys.stderr, _ContextAwareStream):
+        sys.stderr = _ContextAwareStream(sys.stderr)
+
+    token = _LOG_STREAM.set(stream)
+    try:
+        yield stream
+    finally:
+        _LOG_STREAM.reset(token)
+
+
+@contextmanager
+def redirect_output_to_log(log_path, mode="w"):
+    """
+    Send everything printed (and the output of subprocesses started through `run_logged_subprocess`) to `log_path` for
+    the duration of the with-block. This replaces the old approach of running each controller as a separate process
+    with its stdout pointed at the log file.
+    :param log_path: This str is the path of the log file.
+    :param mode: This str is the mode the file is opened with. By default the file is truncated.
+    :yield: The open log file object.
+    """
+    with open(log_path, mode) as log, redirect_output_to_stream(log):
+        yield log
+
+
+def submit_in_context(pool, fn, *args):
+    """
+    Submit a function to a concurrent.futures executor so that it runs with a copy of the caller's context. This keeps
+    output of the worker thread going to the same log file as the caller (see `redirect_output_to_log`).
+    :param pool: This is a ThreadPoolExecutor.
+    :param fn: This is the function to run.
+    :param args: These are the arguments passed to `fn`.
+    :return: The Future returned by the executor.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+# The number of seconds a subprocess (a Word to PDF conversion or a PDF repair) may run before it's killed, so that a hung
+# soffice or Ghostscript can't hold up a generation forever.
+SUBPROCESS_TIMEOUT = config("PDF_GEN_SUBPROCESS_TIMEOUT", default=600, cast=float)
+
+# The time.monotonic() time by which every subprocess of the current generation has to be finished (see
+# `subprocess_deadline`). Like _LOG_STREAM this is carried over to the threads started with `submit_in_context`.
+_SUBPROCESS_DEADLINE = contextvars.ContextVar("subprocess_deadline", default=None)
+
+
+@contextmanager
+def subprocess_deadline(seconds):
+    """
+    Kill every subprocess started through `run_logged_subprocess` in the with-block (and in the threads it submits work
+    to with `submit_in_context`) that is still running `seconds` from now.
+    :param seconds: This is the number of seconds from now.
+    """
+    token = _SUBPROCESS_DEADLINE.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _SUBPROCESS_DEADLINE.reset(token)
+
+
+def run_logged_subprocess(cmd, **kwargs):
+    """
+    Run a command with subprocess.run and send its stdout/stderr to the log file of the current context (if any). The
+    command is killed after SUBPROCESS_TIMEOUT seconds or at the deadline of the current context (see
+    `subprocess_deadline`), whichever comes first.
+    :param cmd: This is a list of strs making up the command to run.
+    :param kwargs: Any other keyword arguments are passed through to subprocess.run.
+    :return: The CompletedProcess returned by subprocess.run.
+    :raise subprocess.TimeoutExpired: The command was killed because it ran out of time.
+    """
+    timeout = min(kwargs.pop("timeout", SUBPROCESS_TIMEOUT), SUBPROCESS_TIMEOUT)
+    deadline = _SUBPROCESS_DEADLINE.get()
+    if deadline is not None:
+        timeout = max(min(timeout, deadline - time.monotonic()), 0)
+    kwargs["timeout"] = timeout
+
+    log = _LOG_STREAM.get()
+    if log is None:
+        return subprocess.run(cmd, **kwargs)
+    log.flush()  # Flush what python has buffered so that the subprocess output lands after it in the log.
+    return subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT, **kwargs)
+
+
+def instantiate_pdf_readers_async(pool, pdf_dir, uploads):
+    """
+    Start instantiating PdfReaders for a set of user uploads in the background (see `instantiate_pdf_reader`). Reading,
+    validating and repairing the uploads doesn't depend on the Word documents so it can overlap with the Word -> PDF
+    conversion.
+    :param pool: This is a ThreadPoolExecutor that the uploads are loaded on.
+    :param pdf_dir: This is a str path to the directory containing the PDFs.
+    :param uploads: This is a list of 2-tuples where the first element is the filename of the PDF and the second
+    element is the label used to identify the file in an error message (or None).
+    :return: A list of Futures in the same order as `uploads`. Each Future resolves to a PdfReader or None. A file that
+    appears more than once in `uploads` is only loaded (and repaired) once.
+    """
+    futures = []
+    loaded = {}  # The Future of every named file submitted so far keyed by filename.
+    for pdf_name, label in uploads:
+        if not pdf_name or pdf_name not in loaded:
+            future = submit_in_context(pool, instantiate_pdf_reader, pdf_dir, pdf_name, label)
+            if pdf_name:
+                loaded[pdf_name] = future
+        futures.append(loaded.get(pdf_name, future))
+    return futures
+
+
+# Where the footer text is stamped (see `pdf_stamp_footer`) in points from the bottom left corner of a page. These match
+# the left margin and footer distance of the first coversheet template, whose footer the stamp replaces.
+FOOTER_STAMP_X = 36
+FOOTER_STAMP_Y = 38
+FOOTER_STAMP_FONT_SIZE = 9
+
+
+def pdf_make_text_page(text, width, height, x, y, font_size):
+    """
+    Create a page that only holds a single line of Helvetica text. It's meant to be merged onto another page.
+    :param text: This str is the text. Characters that aren't in the Windows-1252 code page are replaced by "?".
+    :param width: This is the width of the page in points.
+    :param height: This is the height of the page in points.
+    :param x: This is the x coordinate of the start of the text's baseline in points.
+    :param y: This is the y coordinate of the text's baseline in points.
+    :param font_size: This is the font size in points.
+    :return: A pypdf PageObject.
+    """
+    page = PageObject.create_blank_page(width=width, height=height)
+    font = DictionaryObject({NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+                             NameObject("/BaseFont"): NameObject("/Helvetica"),
+                             NameObject("/Encoding"): NameObject("/WinAnsiEncoding")})
+    page[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    escaped = text.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    contents = DecodedStreamObject()
+    contents.set_data(b"BT /F1 %g Tf %g %g Td (" % (font_size, x, y) + escaped + b") Tj ET")
+    page[NameObject("/Contents")] = contents
+    return page
+
+
+def pdf_stamp_footer(pages, text):
+    """
+    Overlay a footer onto pages. The Word templates are rendered without anything that changes from one generation to
+    the next (like the time the PDF was generated) so that the converted sections only depend on the proposal and can
+    be cached. That kind of text is stamped onto the merged pages instead.
+    :param pages: This is an iterable of the pypdf PageObjects to stamp. They must belong to a PdfWriter.
+    :param text: This str is the footer text.
+    :return: None
+    """
+    stamps = {}  # A stamp page for every page size.
+    for page in pages:
+        size = (page.mediabox.width, page.mediabox.height)
+        if size not in stamps:
+            stamps[size] = pdf_make_text_page(text, size[0], size[1], FOOTER_STAMP_X, FOOTER_STAMP_Y,
+                                              FOOTER_STAMP_FONT_SIZE)
+        page.merge_page(stamps[size])
+
+
+def merge_pdf_files(pdf_paths, output_path, footer_text=None):
+    """
+    Concatenate PDFs into a single PDF.
+    :param pdf_paths: This is a list of str paths to the PDFs in the order they should appear.
+    :param output_path: This str is the path the merged PDF is written to.
+    :param footer_text: This str is stamped as the footer of every page (see `pdf_stamp_footer`). Nothing is stamped if
+    it's None.
+    :return: None
+    """
+    writer = PdfWriter()
+    for pdf_path in pdf_paths:
+        writer.append(pdf_path, import_outline=False)
+    if footer_text is not None:
+        pdf_stamp_footer(writer.pages, footer_text)
+    writer.write(output_path)
@@ -0,0 +1,643 @@
+from decouple import config
+from pdf_gen_helper_functions import *
+from tag_schema import QUERY_COLUMNS
+from os.path import join
+from collections import namedtuple, OrderedDict
+from decimal import Decimal
+from functools import cached_property, wraps
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def select_columns(query, alias):
+    """
+    :param query: This str is the name of one of the per-site queries of ProposalData that are projected (see
+    tag_schema.PROJECTED_QUERIES).
+    :param alias: This str is the name or alias of the query's table in the statement.
+    :return: The str SELECT list of the query's QUERY_COLUMNS.
+    """
+    return ", ".join(alias + "." + column for column in QUERY_COLUMNS[query])
+
+
+def json_agg_columns(query):
+    """
+    :param query: This str is the name of one of the projected per-site queries of ProposalData.
+    :return: The str aggregate that turns the rows of the query's table (aliased t) into a JSON array of objects with
+    only the query's QUERY_COLUMNS. The row of a subquery is aggregated rather than a json_build_object since a function
+    takes at most 100 arguments.
+    """
+    return "json_agg((SELECT r FROM (SELECT " + select_columns(query, "t") + ") r))"
+
+
+# The subqueries that `build_bulk_query` combines into a single statement. Each one aggregates the rows of a table that
+# belong to the proposal with the id %(id)s to a JSON array of row objects. The joins of the individual queries of
+# ProposalData are done in Python (see `ProposalData.load_bulk_rows`) so that the columns of joined tables with the
+# same name (e.g. id) don't collide. The per-site tables only aggregate their QUERY_COLUMNS. Note that "proponent_maps"
+# holds every map row of this proposal's proponents, including those of other proposals, since that is what the
+# proponent query joins on.
+BULK_FRAGMENTS = {
+    "proposal": "SELECT json_agg(t) FROM proposal t WHERE t.id = %(id)s",
+    "coversheet": "SELECT json_agg(t) FROM coversheet t WHERE t.proposal_id = %(id)s",
+    "coversheet_proponent_map": """SELECT json_agg(t ORDER BY t.ordering, t.id) FROM coversheet_proponent_map t
+        WHERE t.proposal_id = %(id)s""",
+    "proponent_maps": """SELECT json_agg(t ORDER BY t.ordering) FROM coversheet_proponent_map t
+        WHERE t.proponent_id IN (SELECT proponent_id FROM coversheet_proponent_map WHERE proposal_id = %(id)s)""",
+    "proponent": """SELECT json_agg(t) FROM proponent t
+        WHERE t.id IN (SELECT proponent_id FROM coversheet_proponent_map WHERE proposal_id = %(id)s)""",
+    "sso_users": """SELECT json_agg(t) FROM sso_users t
+        WHERE t.username = (SELECT coalesce(user_id::text, '') FROM proposal WHERE id = %(id)s)""",
+    "site": "SELECT json_agg(t ORDER BY t.ordering) FROM site t WHERE t.proposal_id = %(id)s",
+    "site_operational_info": "SELECT " + json_agg_columns("site_operational_info") + """ FROM site_operational_info t
+        WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)""",
+    "site_measurements": "SELECT " + json_agg_columns("site_measurements") + """ FROM site_measurements t
+        WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)""",
+    "site_lithos": """SELECT json_agg(t ORDER BY s.ordering, t.min_depth NULLS LAST, t.max_depth NULLS LAST)
+        FROM site_lithos t JOIN site s ON t.site_id = s.id WHERE s.proposal_id = %(id)s""",
+    "site_dataset_info": "SELECT " + json_agg_columns("site_dataset_info") + """ FROM site_dataset_info t
+        WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)""",
+    "site_pollution_safety_hazards": "SELECT " + json_agg_columns("site_pollution_safety") + """ FROM site_pollution_safety_hazards t
+        WHERE t.site_id IN (SELECT id FROM site WHERE proposal_id = %(id)s)""",
+    "srr_checklist": "SELECT json_agg(t) FROM srr_checklist t WHERE t.proposal_id = %(id)s",
+    "pdf_uploads": """SELECT json_agg(json_build_array(t.form_type, t.site_id, t.filename_out)) FROM pdf_uploads t
+        WHERE t.proposal_id = %(id)s""",
+    # These are fetched instead of "proponent" and "sso_users" while LOOKUP_CACHE is enabled. They only hold the key and
+    # version of every row, and the rows themselves are read from the cache (see `ProposalData.read_lookup_rows`). They
+    # aren't part of BULK_QUERY.
+    "proponent_versions": """SELECT json_agg(json_build_array(t.id, t.xmin::text)) FROM proponent t
+        WHERE t.id IN (SELECT proponent_id FROM coversheet_proponent_map WHERE proposal_id = %(id)s)""",
+    "sso_users_versions": """SELECT json_agg(json_build_array(t.username, t.xmin::text)) FROM sso_users t
+        WHERE t.username = (SELECT coalesce(user_id::text, '') FROM proposal WHERE id = %(id)s)""",
+}
+
+# The table whose columns describe the rows of a BULK_FRAGMENTS entry, where that isn't the table of the same name.
+# The pdf_uploads rows are plain arrays so they don't need any columns. The rows of the version fragments are plain
+# arrays too but the columns of their tables are still needed to describe the cached rows.
+FRAGMENT_TABLES = {"proponent_maps": "coversheet_proponent_map", "pdf_uploads": None,
+                   "proponent_versions": "proponent", "sso_users_versions": "sso_users"}
+
+# The lookup tables whose rows are shared by many proposals, mapped to the column that LOOKUP_CACHE keys their rows by.
+# While the cache is enabled their BULK_FRAGMENTS entry is replaced with the one of the same name + "_versions".
+LOOKUP_TABLES = {"proponent": "id", "sso_users": "username"}
+
+# The number of seconds that a row stays in LOOKUP_CACHE after it was fetched, and the number of rows it holds.
+LOOKUP_CACHE_TTL_SECONDS = config("PDF_GEN_LOOKUP_CACHE_TTL_SECONDS", default=600, cast=float)
+LOOKUP_CACHE_MAX_ROWS = config("PDF_GEN_LOOKUP_CACHE_MAX_ROWS", default=4096, cast=int)
+
+# The BULK_FRAGMENTS that every query of ProposalData is built from when it's prefetched.
+QUERY_FRAGMENTS = {
+    "proposal": ["proposal"],
+    "coversheet": ["coversheet"],
+    "coversheet_proponent_map": ["coversheet_proponent_map"],
+    "proponent": ["proponent", "proponent_maps"],
+    "lead_proponent": ["proponent", "coversheet_proponent_map"],
+    "sso_users": ["sso_users"],
+    "site": ["site"],
+    "site_operational_info": ["site", "site_operational_info"],
+    "site_measurements": ["site", "site_measurements"],
+    "site_dataset_info": ["site", "site_dataset_info"],
+    "site_pollution_safety": ["site", "site_pollution_safety_hazards"],
+    "site_lithos": ["site", "site_lithos"],
+    "srr_checklist": ["srr_checklist"],
+    "pdf_uploads": ["pdf_uploads"],
+}
+
+# The queries of ProposalData of a table with one or more rows per site, mapped to that table (and BULK_FRAGMENTS entry).
+# Only their QUERY_COLUMNS are selected.
+SITE_QUERIES = {
+    "site_operational_info": "site_operational_info",
+    "site_measurements": "site_measurements",
+    "site_dataset_info": "site_dataset_info",
+    "site_pollution_safety": "site_pollution_safety_hazards",
+}
+
+# The columns of the BULK_FRAGMENTS entries that don't aggregate every column of their table.
+FRAGMENT_COLUMNS = {fragment: QUERY_COLUMNS[query] for query, fragment in SITE_QUERIES.items()}
+
+
+def build_bulk_query(fragments):
+    """
+    Build a statement that fetches several BULK_FRAGMENTS of a proposal in a single round trip to the database. Its
+    parameters are `id` (the proposal id) and `tables` (the list of tables returned by this function). The columns of
+    those tables (names and types in table order) are returned alongside the rows so that the rows can be rebuilt
+    exactly as the individual queries would have returned them.
+    :param fragments: This is an iterable of str keys of BULK_FRAGMENTS.
+    :return: A 2-tuple where the first element is the str statement and the second element is the list of str tables.
+    """
+    fragments = sorted(set(fragments))
+    tables = sorted({FRAGMENT_TABLES.get(fragment, fragment) for fragment in fragments} - {None})
+    parts = ["""'columns', (SELECT json_object_agg(name, (
+        SELECT json_agg(json_build_array(a.attname, format_type(a.atttypid, a.atttypmod)) ORDER BY a.attnum)
+        FROM pg_attribute a WHERE a.attrelid = name::regclass AND a.attnum > 0 AND NOT a.attisdropped))
+        FROM unnest(%(tables)s::text[]) AS name)"""]
+    parts += ["'%s', (%s)" % (fragment, BULK_FRAGMENTS[fragment]) for fragment in fragments]
+    return "\nSELECT json_build_object(\n    " + ",\n    ".join(parts) + "\n)::text", tables
+
+
+# Every BULK_FRAGMENTS entry (except the version fragments of LOOKUP_TABLES) in one statement. This is what a batch of
+# proposals is prefetched with (see the `prefetched_rows` param of ProposalData).
+BULK_QUERY, BULK_TABLES = build_bulk_query(fragment for fragment in BULK_FRAGMENTS if not fragment.endswith("_versions"))
+
+
+class LookupCache:
+    """
+    A bounded in-process cache of the rows of LOOKUP_TABLES, which recur across many proposals (e.g. a proponent of
+    dozens of proposals). It's only enabled in long-running processes that generate many proposals, i.e. the
+    generation daemon, the pre-generation listener and the gen_script.py workers (see `enable`). Every row is cached
+    along with its version (its xmin, which changes whenever the row is written) and is only returned for that version,
+    so an edited row is fetched again rather than served stale. Rows expire `ttl_seconds` after they were fetched and
+    the least recently used rows are evicted once there are more than `max_rows`. It's shared by the threads of the
+    process.
+    """
+    def __init__(self, max_rows=LOOKUP_CACHE_MAX_ROWS, ttl_seconds=LOOKUP_CACHE_TTL_SECONDS):
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_seconds
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        # Every cached row keyed by (table, columns, key) and mapped to a 3-tuple of its version, the row and the
+        # time.monotonic() it expires at. The least recently used row is first.
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+
+    def enable(self):
+        """
+        Start caching rows. A cache with a TTL of 0 or no room for rows stays disabled.
+        :return: None
+        """
+        self.enabled = self.ttl_seconds > 0 and self.max_rows > 0
+
+    def get(self, key, version):
+        """
+        :param key: This is a hashable key of the row.
+        :param version: This str is the current version of the row.
+        :return: The cached row or None if it isn't cached (or was cached for another version or has expired).
+        """
+        with self.lock:
+            cached = self.rows.get(key)
+            if cached is not None and cached[0] == version and cached[2] > time.monotonic():
+                self.rows.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, row):
+        with self.lock:
+            self.rows[key] = (version, row, time.monotonic() + self.ttl_seconds)
+            self.rows.move_to_end(key)
+            while len(self.rows) > self.max_rows:
+                self.rows.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+            self.hits = self.misses = 0
+
+    def describe(self):
+        """
+        :return: A str summary of the cache's counters, e.g. "12 hits, 3 misses, 15 rows".
+        """
+        with self.lock:
+            return "%d hits, %d misses, %d rows" % (self.hits, self.misses, len(self.rows))
+
+
+# The lookup cache of this process.
+LOOKUP_CACHE = LookupCache()
+
+
+class QueryResult(namedtuple("QueryResult", ["cols", "rows"])):
+    """
+    The result of a query of ProposalData. `cols` is the Columns of the result and `rows` is the list of its rows as
+    Columns records.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def make(cls, cols, rows):
+        """
+        :param cols: This is the list of str column names of the result.
+        :param rows: This is a list of rows (tuples) of the result.
+        :return: A QueryResult.
+        """
+        cols = cols if isinstance(cols, Columns) else Columns(cols)
+        return cls(cols, [cols.record(row) for row in rows])
+
+    @property
+    def row(self):
+        """
+        The first row for queries that return at most one row (e.g. proposal), or None if there are no rows.
+        """
+        return self.rows[0] if self.rows else None
+
+
+def proposal_query(method):
+    """
+    Turn a method of ProposalData that runs a query into a lazily run, memoized property. The method runs the first time
+    the property is read unless the query has been prefetched (see `ProposalData.prefetch`).
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def load(self):
+        if self.prefetched_rows is not None:
+            self.prefetch([name])
+        if name in self.__dict__:
+            return self.__dict__[name]
+        return method(self)
+    return cached_property(load)
+
+
+class ProposalData:
+    """
+    The database rows of a single proposal. Every query is a property (e.g. `data.site.rows`) that runs the first time
+    it's read and is memoized after that. A query that depends on another one (e.g. site_operational_info, which reads
+    the rows of the proposal's sites) reads that query's property, so a generation path only ever fetches the tables it
+    reads. If the whole set is known up front then `prefetch` fetches it in a single round trip instead. The statements
+    that were run are recorded in `queries`.
+    """
+    def __init__(self, pid, cur, pdf_uploads_dir, proposal=None, prefetched_rows=None):
+        """
+        :param pid: This str is the id of the proposal.
+        :param cur: This is the open psycopg2 cursor that the queries are run with.
+        :param pdf_uploads_dir: This str is the path to the directory of the proposal's user uploads.
+        :param proposal: This is an optional QueryResult of the proposal query that the caller has already read.
+        :param prefetched_rows: This is an optional str result of BULK_QUERY for this proposal that has already been
+        fetched (e.g. for a whole batch of proposals at once). If it's specified then every query is read from it
+        instead of the database.
+        """
+        self.PROPOSAL_ID = pid
+        self.PDF_UPLOADS_DIR = pdf_uploads_dir
+        self.cur = cur
+        self.prefetched_rows = prefetched_rows
+        # The names of the prepared statements run for this proposal in the order they were run.
+        self.queries = []
+        if proposal is not None:
+            self.proposal = proposal
+
+
+    def invalidate(self, queries=None):
+        """
+        Forget the results of queries so that they're run again the next time they're read. The tag dicts built from
+        them are rebuilt as well (see WordProposalGenerator's memoize_tags). A query that depends on a forgotten query
+        (e.g. site_operational_info on site) is not forgotten with it and has to be listed too.
+        :param queries: This is an optional iterable of str names of queries (keys of QUERY_FRAGMENTS). Every query is
+        forgotten if it isn't specified.
+        :return: None
+        """
+        for query in list(QUERY_FRAGMENTS) if queries is None else queries:
+            self.__dict__.pop(query, None)
+        # These are derived from other queries so they are always rebuilt.
+        self.__dict__.pop("site_lithos_by_site", None)
+        self.__dict__.pop("site_upload_filenames", None)
+
+
+    def execute(self, name, query, params=()):
+        """
+        Run a query (see `db_execute_prepared`) and record it in `queries`.
+        :param name: This str is the name of the prepared statement.
+        :param query: This str is the query.
+        :param params: This is a tuple of the query's parameters.
+        :return: A QueryResult of every row the query returned.
+        """
+        db_execute_prepared(self.cur, name, query, params)
+        self.queries.append(name)
+        return QueryResult.make([desc[0] for desc in self.cur.description], self.cur.fetchall())
+
+
+    def execute_site_query(self, query):
+        """
+        Run one of SITE_QUERIES. Only the query's QUERY_COLUMNS are selected, and the rows are in the order of the site
+        rows.
+        :param query: This str is the name of the query.
+        :return: A QueryResult.
+        """
+        table = SITE_QUERIES[query]
+        site_ids = [site.id for site in self.site.rows]
+        if not site_ids:
+            return self.execute("pdf_gen_" + query + "_empty",
+                                "SELECT " + select_columns(query, table) + " FROM " + table + " LIMIT 0")
+        return self.execute("pdf_gen_" + query, "SELECT " + select_columns(query, table) + " FROM " + table +
+                            " JOIN site ON " + table + """.site_id = site.id
+            WHERE site_id = ANY(%s) ORDER BY site.ordering""", (site_ids,))
+
+
+    @proposal_query
+    def proposal(self):
+        """The proposal's row of the proposal table."""
+        return self.execute("pdf_gen_proposal", "SELECT * FROM proposal WHERE id = %s", (self.PROPOSAL_ID,))
+
+
+    @proposal_query
+    def coversheet(self):
+        """The proposal's row of the coversheet table."""
+        return self.execute("pdf_gen_coversheet", "SELECT * FROM coversheet WHERE proposal_id = %s", (self.PROPOSAL_ID,))
+
+
+    @proposal_query
+    def coversheet_proponent_map(self):
+        """The proposal's rows of the coversheet_proponent_map table in order."""
+        return self.execute("pdf_gen_coversheet_proponent_map",
+                            "SELECT * FROM coversheet_proponent_map WHERE proposal_id = %s ORDER BY ordering, id",
+                            (self.PROPOSAL_ID,))
+
+
+    @proposal_query
+    def proponent(self):
+        """
+        Every coversheet_proponent_map row of the proposal's proponents (including those of other proposals) joined with
+        the proponent's row of the proponent table.
+        """
+        # If there are no proponents then return an empty result rather than None so that the proponent list is simply
+        # empty.
+        proponent_ids = [row.proponent_id for row in self.coversheet_proponent_map.rows]
+        if not proponent_ids:
+            return self.execute("pdf_gen_proponent_empty", "SELECT * FROM proponent LIMIT 0")
+        return self.execute("pdf_gen_proponent",
+            """SELECT * FROM proponent JOIN coversheet_proponent_map ON
+            proponent.id = coversheet_proponent_map.proponent_id WHERE proponent.id = ANY(%s) ORDER BY
+            coversheet_proponent_map.ordering""", (proponent_ids,))
+
+
+    @proposal_query
+    def lead_proponent(self):
+        """
+        The row of the proponent table of the proposal's principal lead. If there's more than one then it's the first
+        in the order of coversheet_proponent_map, which is the one the bulk query picks as well.
+        """
+        return self.execute("pdf_gen_lead_proponent",
+            """SELECT proponent.* FROM proponent JOIN coversheet_proponent_map ON
+            proponent.id = coversheet_proponent_map.proponent_id WHERE coversheet_proponent_map.proposal_id = %s AND
+            coversheet_proponent_map.role IN ('Principal Lead', 'Principal Lead and Data Lead') ORDER BY
+            coversheet_proponent_map.ordering, coversheet_proponent_map.id LIMIT 1""", (self.PROPOSAL_ID,))
+
+
+    @proposal_query
+    def sso_users(self):
+        """The sso_users row of the user who owns the proposal."""
+        if not self.proposal.row:
+            return self.execute("pdf_gen_sso_users_empty", "SELECT * FROM sso_users LIMIT 0")
+        return self.execute("pdf_gen_sso_users", "SELECT * FROM sso_users WHERE username=%s",
+                            (get_safely(self.proposal.row, self.proposal.cols.index("user_id"), True),))
+
+
+    @proposal_query
+    def site(self):
+        """The proposal's rows of the site table in order."""
+        return self.execute("pdf_gen_site", "SELECT * FROM site WHERE proposal_id=%s ORDER BY ordering",
+                            (self.PROPOSAL_ID,))
+
+
+    @proposal_query
+    def site_operational_info(self):
+        """The site_operational_info rows of the proposal's sites (see `execute_site_query`)."""
+        return self.execute_site_query("site_operational_info")
+
+
+    @proposal_query
+    def site_measurements(self):
+        """The site_measurements rows of the proposal's sites (see `execute_site_query`)."""
+        return self.execute_site_query("site_measurements")
+
+
+    @proposal_query
+    def site_dataset_info(self):
+        """The site_dataset_info rows of the proposal's sites (see `execute_site_query`)."""
+        return self.execute_site_query("site_dataset_info")
+
+
+    @proposal_query
+    def site_pollution_safety(self):
+        """The site_pollution_safety_hazards rows of the proposal's sites (see `execute_site_query`)."""
+        return self.execute_site_query("site_pollution_safety")
+
+
+    @proposal_query
+    def site_lithos(self):
+        """
+        The site_lithos rows of the proposal's sites joined with their site's row. They're sorted by site and then by
+        "min_depth" with ties resolved by "max_depth". Empty depths should appear after 0 in the listing so nulls are
+        sorted last. Note: Null values shouldn't be appearing anyway because this input should be enforced and check
+        client-side but it's good to be aware of this anyway.
+        """
+        return self.execute("pdf_gen_site_lithos",
+            """SELECT * FROM site_lithos JOIN site ON site_lithos.site_id = site.id WHERE site.proposal_id = %s
+            ORDER BY site.ordering, site_lithos.min_depth NULLS LAST, site_lithos.max_depth NULLS LAST""",
+            (self.PROPOSAL_ID,))
+
+
+    @cached_property
+    def site_lithos_by_site(self):
+        """
+        A dict mapping the id of every site to the list of that site's site_lithos rows (in order). A site without
+        lithologies maps to an empty list.
+        """
+        site_lithos_by_site = {site.id: [] for site in self.site.rows}
+        for row in self.site_lithos.rows:
+            site_lithos_by_site[row.site_id].append(row)
+        return site_lithos_by_site
+
+
+    @proposal_query
+    def srr_checklist(self):
+        """The proposal's row of the srr_checklist table."""
+        return self.execute("pdf_gen_srr_checklist", "SELECT * FROM srr_checklist WHERE proposal_id = %s",
+                            (self.PROPOSAL_ID,))
+
+
+    @proposal_query
+    def pdf_uploads(self):
+        """The index of the proposal's user uploads (see `index_pdf_uploads`)."""
+        db_execute_prepared(self.cur, "pdf_gen_pdf_uploads",
+                            "SELECT form_type, site_id, filename_out FROM pdf_uploads WHERE proposal_id = %s",
+                            (self.PROPOSAL_ID,))
+        self.queries.append("pdf_gen_pdf_uploads")
+        return self.index_pdf_uploads(self.cur.fetchall())
+
+
+    @cached_property
+    def site_upload_filenames(self):
+        """The filenames of the site figures in site order. A site without a figure gets None."""
+        return [self.upload_filename("SSF", site.id) for site in self.site.rows]
+
+
+    def index_pdf_uploads(self, rows):
+        """
+        Build the index of a proposal's user uploads.
+        :param rows: This is a list of (form_type, site_id, filename_out) rows of the pdf_uploads table.
+        :return: A dict mapping (form_type, site_id) 2-tuples to dicts with the keys `filename`, `size` and `mtime_ns`
+        (the size and modification time of the upload in PDF_UPLOADS_DIR or None if the file is missing). Uploads that
+        don't belong to a site have a site_id of None. Only the first upload of each key is kept.
+        """
+        index = {}
+        for form_type, site_id, filename in rows:
+            if (form_type, site_id) in index:
+                continue
+            try:
+                stat = os.stat(join(self.PDF_UPLOADS_DIR, filename))
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            except (FileNotFoundError, TypeError):
+                size = mtime_ns = None
+            index[(form_type, site_id)] = {"filename": filename, "size": size, "mtime_ns": mtime_ns}
+        return index
+
+
+    def upload(self, form_type, site_id=None):
+        """
+        Look up a user upload in the pdf_uploads index.
+        :param form_type: This str is the pdf_uploads form type (e.g. "DOC" or "SSF").
+        :param site_id: This is the id of the site the upload belongs to or None for uploads of the whole proposal.
+        :return: The upload's index entry (see `index_pdf_uploads`) or None if there is no such upload.
+        """
+        upload = self.pdf_uploads.get((form_type, site_id))
+        if upload is None and site_id is None:
+            # Uploads of the whole proposal were always looked up by form type alone so don't depend on their site_id.
+            upload = next((value for key, value in self.pdf_uploads.items() if key[0] == form_type), None)
+        return upload
+
+
+    def upload_filename(self, form_type, site_id=None):
+        """
+        Get the filename of a user upload (see `upload`).
+        :return: The str filename or None if there is no such upload.
+        """
+        return (self.upload(form_type, site_id) or {}).get("filename")
+
+
+    def prefetch(self, queries):
+        """
+        Run several queries in a single round trip to the database (see `build_bulk_query`). Queries that have already
+        been run are skipped. Any other query that can be built from the fetched rows (e.g. site, which every site
+        query joins with) is stored as well. While LOOKUP_CACHE is enabled only the versions of the rows of
+        LOOKUP_TABLES are fetched and the rows themselves are read from the cache. If the rows were prefetched for a whole batch of proposals (see the
+        `prefetched_rows` param) then every query is read from them and the database isn't queried at all.
+        :param queries: This is an iterable of str names of queries (keys of QUERY_FRAGMENTS).
+        :return: None
+        """
+        queries = [query for query in queries if query not in self.__dict__]
+        if not queries:
+            return
+        if self.prefetched_rows is not None:
+            bulk_rows, self.prefetched_rows = self.prefetched_rows, None
+        else:
+            fragments = {fragment for query in queries for fragment in QUERY_FRAGMENTS[query]}
+            if LOOKUP_CACHE.enabled:
+                fragments = {fragment + "_versions" if fragment in LOOKUP_TABLES else fragment for fragment in fragments}
+            fragments = sorted(fragments)
+            statement, tables = build_bulk_query(fragments)
+            # The statement differs for every set of fragments so each set is prepared under its own name.
+            name = "pdf_gen_bulk_" + hashlib.sha1(",".join(fragments).encode()).hexdigest()[:12]
+            db_execute_prepared(self.cur, name, statement, {"id": self.PROPOSAL_ID, "tables": tables})
+            self.queries.append(name)
+            bulk_rows = self.cur.fetchone()[0]
+        self.load_bulk_rows(bulk_rows)
+
+
+    def read_lookup_rows(self, table, cols, versions):
+        """
+        Read rows of one of LOOKUP_TABLES through LOOKUP_CACHE. The rows that aren't cached for their current version are
+        fetched in a single query and cached.
+        :param table: This str is the name of the table.
+        :param cols: This is the list of the columns of the table.
+        :param versions: This is the list of [key, version] pairs of the rows (see BULK_FRAGMENTS) or None if there
+        are no rows.
+        :return: A list of the rows (tuples) in the order of `versions`.
+        """
+        key_column = LOOKUP_TABLES[table]
+        # The columns are part of the key so that a row cached before a change to the table's columns isn't used.
+        cache_keys = {key: (table, tuple(cols), key) for key, _ in versions or []}
+        found = {}
+        for key, version in versions or []:
+            row = LOOKUP_CACHE.get(cache_keys[key], version)
+            if row is not None:
+                found[key] = row
+        missing = [key for key in cache_keys if key not in found]
+        if missing:
+            name = "pdf_gen_lookup_" + table
+            db_execute_prepared(self.cur, name, "SELECT t.xmin::text, t.* FROM " + table + " t WHERE t." + key_column +
+                                " = ANY(%s)", (missing,))
+            self.queries.append(name)
+            for version, *row in self.cur.fetchall():
+                row = tuple(row)
+                key = row[cols.index(key_column)]
+                if key in cache_keys:
+                    LOOKUP_CACHE.put(cache_keys[key], version, row)
+                    found[key] = row
+        return [found[key] for key in cache_keys if key in found]
+
+
+    def load_bulk_rows(self, bulk_rows):
+        """
+        Build the result of every query that hasn't been run yet and whose BULK_FRAGMENTS are all part of a bulk query's
+        result, exactly as the query itself would have returned it.
+        :param bulk_rows: This is the str result of a statement built by `build_bulk_query`.
+        :return: None
+        """
+        # Decode numbers as Decimals so that numeric columns keep their exact value (see db_decode_json_value).
+        data = json.loads(bulk_rows, parse_float=Decimal)
+        columns = data.pop("columns") or {}
+        cols, rows = {}, {}
+        for fragment, objects in data.items():
+            table = FRAGMENT_TABLES.get(fragment, fragment)
+            if fragment.endswith("_versions"):
+                cols[table] = [column[0] for column in columns[table]]
+                rows[table] = self.read_lookup_rows(table, cols[table], objects)
+            elif table is not None:
+                table_columns = columns[table]
+                if fragment in FRAGMENT_COLUMNS:
+                    types = dict(map(tuple, table_columns))
+                    table_columns = [[column, types[column]] for column in FRAGMENT_COLUMNS[fragment]]
+                cols[fragment] = [column[0] for column in table_columns]
+                rows[fragment] = db_decode_json_rows(objects, table_columns)
+        results = {}
+
+        for query in ("proposal", "coversheet", "coversheet_proponent_map", "sso_users", "site", "srr_checklist"):
+            if query in rows:
+                results[query] = QueryResult.make(cols[query], rows[query])
+
+        # proponent is joined with the map rows and lead_proponent is the first principal lead.
+        if "proponent" in rows:
+            proponents = {row[cols["proponent"].index("id")]: row for row in rows["proponent"]}
+            if "proponent_maps" in rows:
+                map_cols = cols["proponent_maps"]
+                if proponents:
+                    results["proponent"] = QueryResult.make(cols["proponent"] + map_cols,
+                        [proponents[row[map_cols.index("proponent_id")]] + row for row in rows["proponent_maps"]
+                         if row[map_cols.index("proponent_id")] in proponents])
+                else:
+                    results["proponent"] = QueryResult.make(cols["proponent"], [])
+            if "coversheet_proponent_map" in rows:
+                map_cols = cols["coversheet_proponent_map"]
+                principle_lead_ids = [row[map_cols.index("proponent_id")] for row in rows["coversheet_proponent_map"]
+                                      if row[map_cols.index("role")] in ("Principal Lead", "Principal Lead and Data Lead")]
+                lead = next((proponents[i] for i in principle_lead_ids if i in proponents), None)
+                results["lead_proponent"] = QueryResult.make(cols["proponent"], [lead] if lead else [])
+
+        # The rows of the site tables are ordered by their site's ordering (i.e. by the site's position in the site rows
+        # which are already sorted that way).
+        if "site" in rows:
+            site_cols = cols["site"]
+            sites = {row[site_cols.index("id")]: (i, row) for i, row in enumerate(rows["site"])}
+            for query, fragment in SITE_QUERIES.items():
+                if fragment not in rows:
+                    continue
+                if sites:
+                    site_id = cols[fragment].index("site_id")
+                    results[query] = QueryResult.make(cols[fragment],
+                        sorted((row for row in rows[fragment] if row[site_id] in sites),
+                               key=lambda x: sites[x[site_id]][0]))
+                else:
+                    results[query] = QueryResult.make(cols[fragment], [])
+            # site_lithos is already in order (see BULK_FRAGMENTS).
+            if "site_lithos" in rows:
+                site_id = cols["site_lithos"].index("site_id")
+                results["site_lithos"] = QueryResult.make(cols["site_lithos"] + site_cols,
+                    [row + sites[row[site_id]][1] for row in rows["site_lithos"] if row[site_id] in sites])
+
+        if "pdf_uploads" in data:
+            results["pdf_uploads"] = self.index_pdf_uploads(data["pdf_uploads"] or [])
+
+        for query, result in results.items():
+            self.__dict__.setdefault(query, result)
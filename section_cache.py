@@ -0,0 +1,116 @@
+from decouple import config
+from os.path import join
+from pdf_gen_helper_functions import docx_template_digest, validate_path
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+# Bump this whenever a change to the rendering code (rather than to a template or to the database) changes what a
+# section looks like. Every section cached by an older version is then treated as a miss.
+RENDERER_VERSION = 2
+
+# Converted section PDFs are stored in this directory as <key>.pdf. The directory is shared by every proposal (and by
+# every process generating proposals) since the key already identifies everything that went into a section.
+SECTION_CACHE_DIR = config("SECTION_CACHE_DIR", default=join(config("PROPOSALS_BASE_DIR"), "section_cache"))
+
+# The total size in bytes that the cache is allowed to grow to. The least recently used sections are evicted first.
+SECTION_CACHE_MAX_BYTES = config("SECTION_CACHE_MAX_BYTES", default=512 * 1024 * 1024, cast=int)
+
+# Evicting has to stat every entry in the cache so it's only done once a process has added this many bytes to the cache
+# since it last evicted. The cache can therefore briefly grow past SECTION_CACHE_MAX_BYTES by this much per process.
+SECTION_CACHE_EVICT_EVERY_BYTES = config("SECTION_CACHE_EVICT_EVERY_BYTES", default=SECTION_CACHE_MAX_BYTES // 16,
+                                         cast=int)
+
+# The number of bytes this process has added to the cache since it last evicted (see SECTION_CACHE_EVICT_EVERY_BYTES).
+_BYTES_SINCE_EVICTION = 0
+_BYTES_SINCE_EVICTION_LOCK = threading.Lock()
+
+
+def section_cache_key(template_paths, tag_values):
+    """
+    Compute the cache key of a section.
+    :param template_paths: This is a list of str absolute paths to every Word template the section is rendered from.
+    :param tag_values: This is a JSON serializable object holding all the data (tag dicts and table rows) that is
+    filled into the templates. Values that JSON can't represent (dates, Decimals, ...) are hashed by their str value.
+    :return: A str sha256 hex digest that changes if a template, a tag value or the renderer version changes.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(RENDERER_VERSION).encode())
+    for template_path in template_paths:
+        digest.update(docx_template_digest(template_path).encode())
+    digest.update(json.dumps(tag_values, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def section_cache_get(key, output_path):
+    """
+    Copy a cached section PDF out of the cache. A hit also marks the entry as recently used.
+    :param key: This str is the section's key (see `section_cache_key`).
+    :param output_path: This str is the path the cached PDF is copied to.
+    :return: True if the section was cached and False otherwise.
+    """
+    cached_path = join(SECTION_CACHE_DIR, key + ".pdf")
+    try:
+        shutil.copyfile(cached_path, output_path)
+        os.utime(cached_path)  # The modification time is the entry's "last used" time for LRU eviction.
+    except FileNotFoundError:
+        return False    # Never cached, or evicted (possibly by another process) in the meantime.
+    return True
+
+
+def section_cache_put(key, pdf_path):
+    """
+    Store a converted section PDF in the cache and then, every SECTION_CACHE_EVICT_EVERY_BYTES added, evict the least
+    recently used sections if the cache has grown past SECTION_CACHE_MAX_BYTES.
+    :param key: This str is the section's key (see `section_cache_key`).
+    :param pdf_path: This str is the path to the converted section PDF.
+    :return: None
+    """
+    cache_dir = validate_path(SECTION_CACHE_DIR)
+    # Copy to a unique temporary name and then rename so that other processes never see a partially written entry.
+    temp_path = join(cache_dir, "%s.%s.tmp" % (key, uuid.uuid4().hex))
+    shutil.copyfile(pdf_path, temp_path)
+    os.replace(temp_path, join(cache_dir, key + ".pdf"))
+
+    global _BYTES_SINCE_EVICTION
+    with _BYTES_SINCE_EVICTION_LOCK:
+        _BYTES_SINCE_EVICTION += os.path.getsize(pdf_path)
+        evict = _BYTES_SINCE_EVICTION >= SECTION_CACHE_EVICT_EVERY_BYTES
+        if evict:
+            _BYTES_SINCE_EVICTION = 0
+    if evict:
+        section_cache_evict()
+
+
+def section_cache_evict(max_bytes=SECTION_CACHE_MAX_BYTES):
+    """
+    Delete the least recently used sections until the cache is no larger than `max_bytes`.
+    :param max_bytes: This int is the size in bytes the cache should be reduced to.
+    :return: An int equal to the number of sections that were evicted.
+    """
+    entries = []
+    total = 0
+    with os.scandir(validate_path(SECTION_CACHE_DIR)) as it:
+        for entry in it:
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue    # Evicted by another process while we were scanning.
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            evicted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return evicted
@@ -0,0 +1,127 @@
+from decouple import config
+from os.path import join
+from datetime import datetime
+from pdf_gen_helper_functions import validate_path, db_connection, db_execute_prepared
+from proposal_data import ProposalData, BULK_QUERY, BULK_TABLES
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+# Bump this whenever the layout of a snapshot file changes. Snapshots of another version are refused.
+SNAPSHOT_VERSION = 1
+
+
+def get_default_snapshot_path(proposal_id):
+    """
+    :param proposal_id: This str is the id of the proposal.
+    :return: The str path that a proposal's snapshot is written to when no path is given.
+    """
+    return proposal_id + ".snapshot.json.gz"
+
+
+def export_snapshot(conn, proposal_id, snapshot_path):
+    """
+    Dump everything that WordProposalGenerator reads for a proposal (the result of BULK_QUERY) into a gzipped JSON file.
+    The user uploads themselves aren't copied. Each one is referenced by its filename along with the size and
+    modification time it had when the snapshot was taken so that a render can tell if its copy of an upload differs.
+    :param conn: This is an open psycopg2 connection.
+    :param proposal_id: This str is the id of the proposal.
+    :param snapshot_path: This str is the path the snapshot is written to.
+    :return: The dict that was written.
+    """
+    with conn.cursor() as cur:
+        db_execute_prepared(cur, "pdf_gen_bulk", BULK_QUERY, {"id": proposal_id, "tables": BULK_TABLES})
+        rows = cur.fetchone()[0]
+
+    uploads_dir = join(validate_path(config("PROPOSALS_BASE_DIR")), proposal_id, "pdf_uploads")
+    data = ProposalData(proposal_id, None, uploads_dir, prefetched_rows=rows)
+    if not data.proposal.row:
+        raise RuntimeError("This proposal does not yet exist in the database.")
+
+    snapshot = {"version": SNAPSHOT_VERSION, "proposal_id": proposal_id,
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "rows": rows,
+                "uploads": [{"form_type": form_type, "site_id": site_id, **upload}
+                            for (form_type, site_id), upload in data.pdf_uploads.items()]}
+    with gzip.open(snapshot_path, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    return snapshot
+
+
+def read_snapshot(snapshot_path):
+    """
+    :param snapshot_path: This str is the path to a snapshot written by `export_snapshot`.
+    :return: The snapshot dict.
+    """
+    with gzip.open(snapshot_path, "rt", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("%s is a version %s snapshot but only version %d is supported."
+                         % (snapshot_path, snapshot.get("version"), SNAPSHOT_VERSION))
+    return snapshot
+
+
+def render_snapshot(snapshot_path, c_only=False, output_name=None):
+    """
+    Generate a proposal's PDF from a snapshot without connecting to the database. The controller runs exactly as it
+    would for a live generation except that every table is read from the snapshot (see the `prefetched_rows` param of
+    WordProposalGenerator). The user uploads are read from the proposal's pdf_uploads directory as usual. An upload
+    that is missing there or differs from the one referenced by the snapshot is reported before generating.
+    :param snapshot_path: This str is the path to a snapshot written by `export_snapshot`.
+    :param c_only: This bool tells the controller to produce only the coversheet.
+    :param output_name: This optional str is the filename of the output PDF.
+    :return: None
+    """
+    # Deferred so that exporting a snapshot doesn't load python-docx, pypdf and the controllers.
+    from WordProposalGenerator import WordProposalGenerator
+    from controller_dispatch import get_controller
+
+    snapshot = read_snapshot(snapshot_path)
+    proposal_id = snapshot["proposal_id"]
+    obj = WordProposalGenerator(proposal_id, prefetched_rows=snapshot["rows"])
+
+    if not c_only:
+        for upload in snapshot["uploads"]:
+            try:
+                stat = os.stat(join(obj.PDF_UPLOADS_DIR, upload["filename"]))
+            except (FileNotFoundError, TypeError):
+                print("WARNING: the upload %s is missing from %s." % (upload["filename"], obj.PDF_UPLOADS_DIR))
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (upload["size"], upload["mtime_ns"]):
+                print("WARNING: the upload %s differs from the one the snapshot was taken with." % upload["filename"])
+
+    proposal = obj.data.proposal
+    controller, generate = get_controller(proposal.row.proposal_type)
+    try:
+        generate(proposal_id, c_only, output_name, None, proposal.row, proposal.cols, obj)
+    finally:
+        obj.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a proposal's database rows to a snapshot file or generate a "
+                                                 "PDF from a snapshot without a database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write a snapshot of a proposal.")
+    export_parser.add_argument("proposal_id", type=str, help="This str specifies the proposal id to snapshot.")
+    export_parser.add_argument("--snapshot-file", "-s", action="store", help="The path to write the snapshot to. Defaults to <proposal id>.snapshot.json.gz.")
+    render_parser = subparsers.add_parser("render", help="Generate a proposal's PDF from a snapshot.")
+    render_parser.add_argument("snapshot_file", type=str, help="The path to a snapshot written by the export command.")
+    render_parser.add_argument("--coversheet-only", "-c", action="store_true", help="This bool tells the program to produce only the coversheet.")
+    render_parser.add_argument("--output-filename", "-o", action="store", help="This argument should be a string which will be the name of the output PDF.")
+    args = parser.parse_args()
+
+    tic = time.perf_counter()
+    if args.command == "export":
+        snapshot_path = args.snapshot_file or get_default_snapshot_path(args.proposal_id)
+        with db_connection() as conn:
+            snapshot = export_snapshot(conn, args.proposal_id, snapshot_path)
+        print("Wrote %s (%d bytes, %d uploads referenced)"
+              % (snapshot_path, os.path.getsize(snapshot_path), len(snapshot["uploads"])))
+    else:
+        render_snapshot(args.snapshot_file, args.coversheet_only, args.output_filename)
+    print(f"Completed in {time.perf_counter() - tic:0.4f} seconds")
+    sys.exit(0)
@@ -0,0 +1,228 @@
+from pdf_gen_helper_functions import *
+from functools import partial
+from operator import attrgetter
+
+# The ProposalData queries that return at most one row. A tag of one of these is a single value read like
+# `get_safely(row, cols.index(column), True)`, i.e. a missing row or a null becomes "". A tag of any other query is the
+# list of its value for every row.
+SINGLE_ROW_QUERIES = ("proposal", "coversheet", "lead_proponent", "srr_checklist")
+
+# The per-site queries whose SELECT lists are generated from the schemas below (see QUERY_COLUMNS). Only the columns
+# named by a schema are fetched for them so anything else that reads their rows may only read those columns.
+PROJECTED_QUERIES = ("site_operational_info", "site_measurements", "site_dataset_info", "site_pollution_safety")
+
+
+def format_lat_long(latitude, longitude):
+    return (docx_format_number(latitude, return_str=True, val_to_return_if_null='') + "\n" +
+            docx_format_number(longitude, return_str=True, val_to_return_if_null=''))
+
+
+def format_total_days_on_site(days_drilling, days_logging):
+    return docx_format_number(docx_format_number(days_drilling, val_to_return_if_null=0, return_str=False) +
+                              docx_format_number(days_logging, val_to_return_if_null=0, return_str=False),
+                              val_to_return_if_null=0)
+
+
+format_number_or_blank = partial(docx_format_number, val_to_return_if_null='')
+
+# Every entry of a tag schema is a 4-tuple of the tag, the ProposalData query it's read from, the column (or tuple of
+# columns) it's read from and the formatter that the column values are passed to (None to use the value as it is).
+GENERAL_SITE_INFO_SCHEMA = [
+    ('proposal_title', "coversheet", "title", None),
+    ('proposal_submitted_date', "proposal", "submit_date", None),
+    ('previous_drilling', "site", "previous_drilling", docx_format_string),
+    ('site_objective', "site", "site_objective", docx_format_string),
+    ('name', "site", "name", None),
+    ('area', "site", "area", None),
+    ('jurisdiction', "site", "jurisdiction", None),
+    ('dist_to_land', "site", "dist_to_land", None),
+    ('former_sitename', "site", "former_sitename", None),
+    ('latitude', "site", "latitude", format_number_or_blank),
+    ('longitude', "site", "longitude", format_number_or_blank),
+    ('lat_long', "site", ("latitude", "longitude"), format_lat_long),
+    ('datum', "site", "datum", None),
+    ('water_depth', "site", "water_depth", docx_format_number),
+    ('is_primary_cb', "site", "is_primary", lambda is_primary: is_primary == 'primary'),
+    ('is_alternate_cb', "site", "is_primary", lambda is_primary: is_primary == 'alternate'),
+    ('site_operational_info.total_days_on_site', "site_operational_info", ("days_drilling", "days_logging"), format_total_days_on_site),
+    ('site_operational_info.hw_shallow_gas_cb', "site_operational_info", "hw_shallow_gas", None),
+    ('site_operational_info.hw_seabed_compl_cb', "site_operational_info", "hw_seabed_compl", None),
+    ('site_operational_info.hw_shall_water_flow_cb', "site_operational_info", "hw_shall_water_flow", None),
+    ('site_operational_info.hw_slide_turb_cb', "site_operational_info", "hw_slide_turb", None),
+    ('site_operational_info.hw_hydrotherm_act_cb', "site_operational_info", "hw_hydrotherm_act", None),
+    ('site_operational_info.hw_seabed_soft_cb', "site_operational_info", "hw_seabed_soft", None),
+    ('site_operational_info.hw_hc_cb', "site_operational_info", "hw_hc", None),
+    ('site_operational_info.hw_currents_cb', "site_operational_info", "hw_currents", None),
+    ('site_operational_info.hw_ch4h2o_cb', "site_operational_info", "hw_ch4h2o", None),
+    ('site_operational_info.hw_abnorm_p_cb', "site_operational_info", "hw_abnorm_p", None),
+    ('site_operational_info.hw_fract_zone_cb', "site_operational_info", "hw_fract_zone", None),
+    ('site_operational_info.hw_dia_volc_cb', "site_operational_info", "hw_dia_volc", None),
+    ('site_operational_info.hw_mm_object_cb', "site_operational_info", "hw_mm_object", None),
+    ('site_operational_info.hw_fault_cb', "site_operational_info", "hw_fault", None),
+    ('site_operational_info.hw_high_temp_cb', "site_operational_info", "hw_high_temp", None),
+    ('site_operational_info.hw_h2s_cb', "site_operational_info", "hw_h2s", None),
+    ('site_operational_info.hw_high_dip_angle_cb', "site_operational_info", "hw_high_dip_angle", None),
+    ('site_operational_info.hw_ice_cb', "site_operational_info", "hw_ice", None),
+    ('site_operational_info.hw_co2_cb', "site_operational_info", "hw_co2", None),
+    ('site_operational_info.weather_win', "site_operational_info", "weather_win", docx_format_string),
+    ('site_operational_info.hw_sens_mar_habitat', "site_operational_info", "hw_sens_mar_habitat", docx_format_string),
+    ('site_operational_info.hw_other', "site_operational_info", "hw_other", docx_format_string),
+    ('site_operational_info.days_drilling', "site_operational_info", "days_drilling", docx_format_number),
+    ('site_operational_info.days_logging', "site_operational_info", "days_logging", docx_format_number),
+    ('site_operational_info.plan_fut', "site_operational_info", "plan_fut", None),
+    ('site_operational_info.plan_apc_cb', "site_operational_info", "plan_apc", None),
+    ('site_operational_info.plan_xcb_cb', "site_operational_info", "plan_xcb", None),
+    ('site_operational_info.plan_rcb_cb', "site_operational_info", "plan_rcb", None),
+    ('site_operational_info.plan_reentry_cb', "site_operational_info", "plan_reentry", None),
+    ('site_operational_info.plan_pcs_cb', "site_operational_info", "plan_pcs", None),
+    ('site_operational_info.sediment_penetration', "site_operational_info", "sediment_penetration", docx_format_number),
+    ('site_operational_info.basement_penetration', "site_operational_info", "basement_penetration", docx_format_number),
+    ('site_operational_info.total_sediment', "site_operational_info", "total_sediment", docx_format_number),
+    ('site_operational_info.total_penetration', "site_operational_info", "total_penetration", docx_format_number),
+    ('site_operational_info.plan_core', "site_operational_info", "plan_core", docx_format_string),
+    ('site_measurement.wl_rel_cb', "site_measurements", "wl_rel", None),
+    ('site_measurement.mag_susc_rel_cb', "site_measurements", "mag_susc_rel", None),
+    ('site_measurement.form_img_ac_rel_cb', "site_measurements", "form_img_ac_rel", None),
+    ('site_measurement.bh_t_p_rel_cb', "site_measurements", "bh_t_p_rel", None),
+    ('site_measurement.vsp_rel_cb', "site_measurements", "vsp_rel", None),
+    ('site_measurement.lwd_acc_rel_cb', "site_measurements", "dens_neut_rel", None),
+    ('site_measurement.neut_poros_rel_cb', "site_measurements", "neut_poros_rel", None),
+    ('site_measurement.lith_dens_rel_cb', "site_measurements", "lith_dens_rel", None),
+    ('site_measurement.g_ray_rel_cb', "site_measurements", "g_ray_rel", None),
+    ('site_measurement.std_acc_rel_cb', "site_measurements", "std_acc_rel", None),
+    ('site_measurement.form_img_rel_cb', "site_measurements", "form_img_rel", None),
+    ('site_measurement.check_shot_survey_rel', "site_measurements", "check_shot_survey_rel", None),
+    ('site_measurement.form_t_p_rel_cb', "site_measurements", "form_t_p_rel", None),
+    ('site_measurement.other_rel', "site_measurements", "other", None),
+    ('site_measurement.other_obj', "site_measurements", "other_obj", None),
+    ('site_measurement.resist_rel_cb', "site_measurements", "resist_rel", None),
+    ('site_operational_info.sediment_litho', "site_operational_info", "sediment_litho", None),
+    ('site_operational_info.basement_litho', "site_operational_info", "basement_litho", None),
+]
+
+# The data types of site_dataset_info that each have an "_in_ssdb" and a "_dsc" column, in the order they're listed on
+# the site survey form.
+SITE_SURVEY_DATA_TYPES = ["seism_veloc", "seismic_grid", "refraction_surf", "refraction_bottom", "a_3_5_khz",
+                          "swath_bathy", "side_look_sonar_surf", "side_look_sonar_bottom", "photo_video", "heat_flow",
+                          "magnetics", "gravity", "sedim_cores", "rock_samples", "water_current_data", "ice_cond",
+                          "obs_micros", "navigation", "other"]
+
+SITE_SURVEY_SCHEMA = [
+    ('proposal_number', "proposal", "proposal_number", None),
+    ('proposal_type_name', "proposal", "proposal_type", None),
+    ('proposal_version', "proposal", "vers", None),
+] + [
+    ('site_dataset_info.' + line + '_will_upload', "site_dataset_info", line + '_will_upload', None)
+    for line in ("primary_hrsr", "crossing_hrsr", "primary_dpsr", "crossing_dpsr")
+] + [
+    ('site_dataset_info.' + line + '_loc_pos_descp', "site_dataset_info",
+     (line + '_location', line + '_position', line + '_position_type', line + '_description'),
+     docx_format_seismic_reflection_data)
+    for line in ("primary_hrsr", "crossing_hrsr", "primary_dpsr", "crossing_dpsr")
+] + [
+    ('site_dataset_info.' + data_type + suffix, "site_dataset_info", data_type + suffix, None)
+    for data_type in SITE_SURVEY_DATA_TYPES for suffix in ("_in_ssdb", "_dsc")
+]
+
+ENVIRONMENTAL_PROTECTION_SCHEMA = [
+    ('site_pollution_safety_hazard.' + column, "site_pollution_safety", column, None)
+    for column in ("oper_summary", "hc_dsdp_odp", "hc_com", "ch4h2o", "hc_accum", "precaut_sp", "aband_proc",
+                   "mm_hazards", "major_risk")
+]
+
+COVERSHEET_SCHEMA = [
+    ('proposal_number', "proposal", "proposal_number", docx_format_string),
+    ('proposal_type_name', "proposal", "proposal_type", docx_format_string),
+    ('proposal_version', "proposal", "vers", docx_format_string),
+    ('principal_lead_name', "lead_proponent", ("first", "last"), lambda first, last: first + " " + last),
+    ('principal_lead_affiliation', "lead_proponent", "affiliation", None),
+    ('principal_lead_country', "lead_proponent", "country", None),
+    ('perm_to_post_cb', "proposal", "perm_to_post", lambda value: (value, {'1': 'Yes', '0': 'No'})),
+    ('coversheet.title_short', "coversheet", "title_short", None),
+    ('coversheet.title', "coversheet", "title", None),
+    ('coversheet.keywords', "coversheet", "keywords", None),
+    ('coversheet.geo_area', "coversheet", "geo_area", None),
+    ('coversheet.abstract', "coversheet", "abstract", docx_format_string),
+    ('coversheet.objective', "coversheet", "objective", docx_format_string),
+    ('coversheet.contact_operator_ans', "coversheet", "contact_operator_ans",
+     lambda value: (value, {'True': 'Yes', 'False': 'No', 'yes': 'Yes', 'no': 'No'})),
+    ('coversheet.non_stnd_measures', "coversheet", "non_stnd_measures", docx_format_string),
+    ('coversheet.sci_plain_lang', "coversheet", "sci_plain_lang", docx_format_string),
+    ('received_for_date', "proposal", "received_for_date", None),
+    ('resubmission_prpsl_num', "proposal", "resubmission_prpsl_num", None),
+    ('resubmission_explanation', "proposal", "resubmission_explanation", docx_format_string),
+]
+
+
+def compile_tag(query, columns, formatter):
+    """
+    Compile a single schema entry into a function that reads the tag's value from a query's result.
+    :param query: This str is the name of the ProposalData query.
+    :param columns: This is a tuple of the str columns that are passed to `formatter`.
+    :param formatter: This is a callable taking one value per column, or None if there's only one column and its value
+    is used as it is.
+    :return: A function taking the QueryResult of `query` and returning the tag's value.
+    """
+    if query in SINGLE_ROW_QUERIES:
+        def extract(result):
+            values = [get_safely(result.row, result.cols.index(column), True) for column in columns]
+            return values[0] if formatter is None else formatter(*values)
+        return extract
+
+    # The rows are records so the columns are read as attributes which resolves their names once here rather than
+    # once per row.
+    get = attrgetter(*columns)
+    if formatter is None:
+        return lambda result: list(map(get, result.rows))
+    if len(columns) == 1:
+        return lambda result: [formatter(get(row)) for row in result.rows]
+    return lambda result: [formatter(*get(row)) for row in result.rows]
+
+
+def compile_tag_schema(schema):
+    """
+    Compile a tag schema once into a function that builds its tags. The function returns a LazyTags so that a tag's
+    query is only read and its extractor only run if the tag is looked up, i.e. if it occurs in a template that's filled
+    in with it.
+    :param schema: This is a list of the (tag, query, columns, formatter) entries described above.
+    :return: A function taking a ProposalData and returning a LazyTags of every tag in schema order. Its `queries`
+    attribute is the list of the queries it reads.
+    """
+    extractors = {}
+    for tag, query, columns, formatter in schema:
+        columns = (columns,) if isinstance(columns, str) else tuple(columns)
+        extractors[tag] = (query, compile_tag(query, columns, formatter))
+    queries = list(dict.fromkeys(query for query, _ in extractors.values()))
+
+    def build_tags(data):
+        def compute(tag):
+            query, extract = extractors[tag]
+            return extract(getattr(data, query))
+        return LazyTags(extractors, compute)
+    build_tags.queries = queries
+    return build_tags
+
+
+def get_schema_columns(schemas, queries):
+    """
+    :param schemas: This is a list of tag schemas.
+    :param queries: This is an iterable of str names of per-site queries.
+    :return: A dict mapping every query to the list of the columns the schemas read from it, in schema order and
+    preceded by site_id, which the rows are joined with their site on.
+    """
+    columns = {query: ["site_id"] for query in queries}
+    for schema in schemas:
+        for _, query, query_columns, _ in schema:
+            if query in columns:
+                columns[query] += [query_columns] if isinstance(query_columns, str) else list(query_columns)
+    return {query: list(dict.fromkeys(query_columns)) for query, query_columns in columns.items()}
+
+
+GENERAL_SITE_INFO_TAGS = compile_tag_schema(GENERAL_SITE_INFO_SCHEMA)
+SITE_SURVEY_TAGS = compile_tag_schema(SITE_SURVEY_SCHEMA)
+ENVIRONMENTAL_PROTECTION_TAGS = compile_tag_schema(ENVIRONMENTAL_PROTECTION_SCHEMA)
+COVERSHEET_TAGS = compile_tag_schema(COVERSHEET_SCHEMA)
+
+# The columns that are selected for each of PROJECTED_QUERIES instead of `SELECT *` (see ProposalData).
+QUERY_COLUMNS = get_schema_columns([GENERAL_SITE_INFO_SCHEMA, SITE_SURVEY_SCHEMA, ENVIRONMENTAL_PROTECTION_SCHEMA],
+                                   PROJECTED_QUERIES)